@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark IbexDB latency: Lambda Function URL vs API Gateway
+Run with: python3 scripts/compare_endpoints.py
+
+Uses IBEX_FUNCTION_URL and/or IBEX_API_URL (+ IBEX_API_KEY) from the environment.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import statistics
+from src.lib.ibex_client_function_url import FunctionURLIbexClient
+from src.lib.ibex_client_optimized import OptimizedIbexClient
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def compare_endpoints():
+    """Compare performance between Function URL and API Gateway"""
+
+    print("="*60)
+    print("FUNCTION URL vs API GATEWAY PERFORMANCE COMPARISON")
+    print("="*60)
+
+    # Test payload
+    test_payload = {
+        "operation": "QUERY",
+        "table": "food_entries",
+        "limit": 10
+    }
+
+    # Test Function URL
+    if os.environ.get('IBEX_FUNCTION_URL'):
+        print("\n📊 Testing Function URL...")
+        function_client = FunctionURLIbexClient(
+            function_url=os.environ['IBEX_FUNCTION_URL'],
+            tenant_id="test"
+        )
+
+        function_times = []
+        for i in range(10):
+            start = time.perf_counter()
+            function_client._call(test_payload, use_cache=False)
+            end = time.perf_counter()
+            function_times.append((end - start) * 1000)
+            print(f"  Run {i+1}: {function_times[-1]:.2f}ms")
+
+        print(f"\n  Function URL Average: {statistics.mean(function_times):.2f}ms")
+        print(f"  Function URL P95: {sorted(function_times)[int(len(function_times)*0.95)]:.2f}ms")
+
+    # Test API Gateway
+    if os.environ.get('IBEX_API_URL'):
+        print("\n📊 Testing API Gateway...")
+        api_client = OptimizedIbexClient(
+            api_url=os.environ['IBEX_API_URL'],
+            api_key=os.environ.get('IBEX_API_KEY', ''),
+            tenant_id="test"
+        )
+
+        api_times = []
+        for i in range(10):
+            start = time.perf_counter()
+            api_client._call(test_payload, use_cache=False)
+            end = time.perf_counter()
+            api_times.append((end - start) * 1000)
+            print(f"  Run {i+1}: {api_times[-1]:.2f}ms")
+
+        print(f"\n  API Gateway Average: {statistics.mean(api_times):.2f}ms")
+        print(f"  API Gateway P95: {sorted(api_times)[int(len(api_times)*0.95)]:.2f}ms")
+
+    # Compare
+    if 'function_times' in locals() and 'api_times' in locals():
+        improvement = ((statistics.mean(api_times) - statistics.mean(function_times)) /
+                      statistics.mean(api_times)) * 100
+        print(f"\n🎯 Function URL is {improvement:.1f}% faster than API Gateway")
+
+    print("="*60)
+
+if __name__ == "__main__":
+    compare_endpoints()
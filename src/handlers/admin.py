@@ -8,7 +8,7 @@ from typing import Dict, Any
 
 from utils.timestamps import utc_now
 
-from lib.auth_provider_enhanced import require_admin_role
+from lib.auth_provider_enhanced import require_admin_role, invalidate_role
 from lib.logger import logger, log_handler
 from utils.http import respond
 
@@ -115,6 +115,7 @@ def update_user_role(event: Dict[str, Any], context: Dict[str, Any]) -> Dict[str
         )
 
         if result and result.get('success'):
+            invalidate_role(user_id, db)
             logger.info(f"Admin {admin_id} updated user {user_id} role to {new_role}")
             return respond(200, {
                 "message": "User role updated successfully",
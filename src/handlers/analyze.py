@@ -4,6 +4,7 @@ This demonstrates how to apply all the new patterns to existing handlers
 """
 
 import json
+import orjson
 import uuid
 from typing import Dict, Any, Optional
 
@@ -527,7 +528,7 @@ def _store_receipt(
                         'category': item_rec.get('category', ''),
                         'unit_price': item_rec.get('unit_price', 0),
                         'store_name': merchant,
-                        'embedding': json.dumps(emb),
+                        'embedding': orjson.dumps(emb).decode(),
                         'embedding_model': 'text-embedding-3-small',
                         'created_at': utc_now()
                     })
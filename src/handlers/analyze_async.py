@@ -1,6 +1,8 @@
 import json
+import orjson
 import os
 import uuid
+import threading
 from typing import Dict, Any, Optional
 
 from lib.auth_provider import get_user_id, require_auth
@@ -9,6 +11,22 @@ from lib.ai_optimized import OptimizedAIService
 from lib.rate_limiter import check_analysis_quota, FREE_DAILY_LIMIT
 from utils.timestamps import utc_now, utc_date
 import boto3
+from botocore.config import Config
+
+# One SQS client per container: building a boto3 client costs tens of ms and
+# its connection pool is what keeps the queue connection warm between requests
+_SQS_CLIENT = None
+_SQS_CLIENT_LOCK = threading.Lock()
+
+
+def _get_sqs_client():
+    """Lazily create the shared SQS client used to enqueue analyses."""
+    global _SQS_CLIENT
+    if _SQS_CLIENT is None:
+        with _SQS_CLIENT_LOCK:
+            if _SQS_CLIENT is None:
+                _SQS_CLIENT = boto3.client('sqs', config=Config(tcp_keepalive=True, max_pool_connections=16))
+    return _SQS_CLIENT
 
 
 def _to_title_case(text: str) -> str:
@@ -157,7 +175,7 @@ def submit_analysis(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }])
         
         # 2. Send to SQS queue - DO NOT send image data, only references
-        sqs = boto3.client('sqs')
+        sqs = _get_sqs_client()
         # Use full URL for SQS (not just queue name)
         queue_url = os.environ.get('ANALYSIS_QUEUE_URL',
                                    'https://sqs.ap-south-1.amazonaws.com/808527335982/nutriwealth-analysis-queue')
@@ -679,7 +697,7 @@ def _store_receipt_result(db, user_id: str, entry_id: str, data: Dict, image_url
                             'category': item_rec.get('category', ''),
                             'unit_price': item_rec.get('unit_price', item_rec.get('total_price', 0)),
                             'store_name': data.get('merchant_name', 'Unknown'),
-                            'embedding': json.dumps(emb),
+                            'embedding': orjson.dumps(emb).decode(),
                             'embedding_model': 'text-embedding-3-small',
                             'created_at': utc_now()
                         })
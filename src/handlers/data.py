@@ -69,11 +69,29 @@ def resolve_schema_key(table_name: str, schemas: dict) -> Optional[str]:
 
 
 def sanitize_json_response(data: Any) -> Any:
-    """Replace NaN and other non-JSON values in response data"""
+    """Replace NaN and other non-JSON values in response data.
+
+    Containers are only copied when something inside them changes, so clean
+    records (the common case) are returned as-is without rebuilding.
+    """
     if isinstance(data, dict):
-        return {k: sanitize_json_response(v) for k, v in data.items()}
+        cleaned = None
+        for k, v in data.items():
+            new_v = sanitize_json_response(v)
+            if new_v is not v:
+                if cleaned is None:
+                    cleaned = dict(data)
+                cleaned[k] = new_v
+        return data if cleaned is None else cleaned
     elif isinstance(data, list):
-        return [sanitize_json_response(item) for item in data]
+        cleaned = None
+        for i, item in enumerate(data):
+            new_item = sanitize_json_response(item)
+            if new_item is not item:
+                if cleaned is None:
+                    cleaned = list(data)
+                cleaned[i] = new_item
+        return data if cleaned is None else cleaned
     elif isinstance(data, float):
         if data != data:  # NaN check
             return None
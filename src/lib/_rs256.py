@@ -0,0 +1,288 @@
+"""
+Shared RS256 JWT verification
+
+One implementation of JWKS fetching and RS256 token verification for every
+auth provider (OIDC and Cognito). JWKS documents, parsed public keys and
+recently verified tokens are cached at module level so they are shared by
+all verifier instances in a warm container.
+"""
+
+import re
+import base64
+import hashlib
+import orjson
+import time
+import threading
+import jwt
+import urllib3
+from urllib3.util.retry import Retry
+from cryptography.hazmat.primitives.asymmetric import rsa
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+from lib.logger import logger
+
+# JWKS documents shared by every verifier:
+# jwks_uri -> {"jwks", "keys_by_kid", "etag", "last_modified", "refresh_at", "expires_at"}
+_JWKS_CACHE: Dict[str, Dict[str, Any]] = {}
+_JWKS_LOCK = threading.Lock()
+_JWKS_CACHE_TTL = 3600  # 1 hour (minimum; a longer Cache-Control max-age wins)
+_JWKS_REFRESH_AT = 0.8  # refresh in the background after 80% of the TTL
+_JWKS_REFRESHING = set()
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+# Unknown-kid refreshes (key rotation): at most one per uri every 10 seconds
+_FORCED_REFRESH_INTERVAL = 10
+_FORCED_REFRESH_AT: Dict[str, float] = {}
+_FORCED_REFRESH_LOCK = threading.Lock()
+
+# Parsed RSA public keys: (jwks_uri, kid) -> key object ready for jwt.decode.
+# Only used while the kid is still listed in the current, unexpired JWKS entry
+_PUBLIC_KEYS: Dict[Tuple[str, str], Any] = {}
+
+_DECODE_ALGORITHMS = ["RS256"]
+
+# Tokens longer than this are rejected without decoding
+_MAX_TOKEN_LENGTH = 8192
+
+# Verified claims by (jwks_uri, audience, issuer, sha256(token)[:16]) -> (expires_at, claims),
+# oldest first (plain dicts keep insertion order)
+_VERIFY_CACHE: Dict[Tuple[Any, ...], Tuple[float, Dict[str, Any]]] = {}
+_VERIFY_LOCK = threading.Lock()
+_VERIFY_CACHE_TTL = 300  # never beyond the token's own exp
+_VERIFY_CACHE_MAX = 1024
+
+# Keep-alive connections to identity providers, reused across requests.
+# Idempotent calls retry once on gateway errors (POSTs are never retried,
+# authorization codes are single-use). Plain urllib3 rather than requests:
+# these calls are small and on the auth path, so the Session/adapter layering
+# is pure per-call overhead
+HTTP_POOL = urllib3.PoolManager(
+    num_pools=10,
+    maxsize=50,
+    headers={"Accept-Encoding": "gzip"},
+    retries=Retry(total=1, backoff_factor=0.1, status_forcelist=[502, 503, 504], raise_on_status=False)
+)
+
+
+def _fetch_jwks(jwks_uri: str) -> Optional[Dict[str, Any]]:
+    """Fetch (or revalidate) the JWKS for jwks_uri and update the cache entry"""
+    entry = _JWKS_CACHE.get(jwks_uri)
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = HTTP_POOL.request("GET", jwks_uri, headers=headers, timeout=5.0)
+        if response.status == 304 and entry:
+            jwks, keys_by_kid = entry["jwks"], entry["keys_by_kid"]
+        elif response.status == 200:
+            jwks = orjson.loads(response.data)
+            keys_by_kid = {key["kid"]: key for key in jwks.get("keys", []) if "kid" in key}
+        else:
+            logger.error(f"Failed to fetch JWKS: HTTP {response.status}")
+            return None
+    except Exception as e:
+        logger.error(f"Failed to fetch JWKS: {e}")
+        return None
+
+    ttl = _JWKS_CACHE_TTL
+    match = _MAX_AGE_RE.search(response.headers.get("Cache-Control", ""))
+    if match:
+        ttl = max(ttl, int(match.group(1)))
+
+    now = time.time()
+    new_entry = {
+        "jwks": jwks,
+        "keys_by_kid": keys_by_kid,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "refresh_at": now + ttl * _JWKS_REFRESH_AT,
+        "expires_at": now + ttl
+    }
+    with _JWKS_LOCK:
+        _JWKS_CACHE[jwks_uri] = new_entry
+        if jwks is not (entry or {}).get("jwks"):
+            # Forget parsed keys the provider no longer publishes
+            for cache_key in [k for k in _PUBLIC_KEYS if k[0] == jwks_uri and k[1] not in keys_by_kid]:
+                _PUBLIC_KEYS.pop(cache_key, None)
+    return new_entry
+
+
+def _refresh_jwks_async(jwks_uri: str):
+    """Revalidate the JWKS on a background thread (one refresh per uri at a time)"""
+    with _JWKS_LOCK:
+        if jwks_uri in _JWKS_REFRESHING:
+            return
+        _JWKS_REFRESHING.add(jwks_uri)
+
+    def run():
+        try:
+            _fetch_jwks(jwks_uri)
+        finally:
+            with _JWKS_LOCK:
+                _JWKS_REFRESHING.discard(jwks_uri)
+
+    threading.Thread(target=run, name="jwks-refresh", daemon=True).start()
+
+
+def _force_jwks_refresh(jwks_uri: str) -> Dict[str, Any]:
+    """Re-fetch the JWKS after an unknown kid, rate limited and single-flight.
+
+    Threads that queue behind an in-flight refresh reuse its result instead of
+    fetching again. Returns the (possibly unchanged) cached keys by kid, or
+    nothing when the cached JWKS has expired and could not be refreshed.
+    """
+    with _FORCED_REFRESH_LOCK:
+        now = time.monotonic()
+        if now - _FORCED_REFRESH_AT.get(jwks_uri, float("-inf")) >= _FORCED_REFRESH_INTERVAL:
+            _FORCED_REFRESH_AT[jwks_uri] = now
+            logger.info(f"Unknown signing key, refreshing JWKS from {jwks_uri}")
+            _fetch_jwks(jwks_uri)
+    entry = _JWKS_CACHE.get(jwks_uri)
+    return entry["keys_by_kid"] if entry and time.time() < entry["expires_at"] else {}
+
+
+def _b64url_decode(value: str) -> bytes:
+    """Decode unpadded base64url (as used in JWTs and JWKs)"""
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _parse_token_header(token: str) -> Optional[Dict[str, Any]]:
+    """Cheaply decode a JWT header, returning None unless it is a plausible RS256 token"""
+    if not isinstance(token, str) or len(token) > _MAX_TOKEN_LENGTH or token.count(".") != 2:
+        return None
+    header_b64 = token[:token.index(".")]
+    try:
+        header = orjson.loads(_b64url_decode(header_b64))
+    except (ValueError, orjson.JSONDecodeError):
+        return None
+    if not isinstance(header, dict) or header.get("alg") != "RS256":
+        return None
+    return header
+
+
+class RS256Verifier:
+    """Verifies RS256 JWTs against a JWKS endpoint for one audience/issuer"""
+
+    def __init__(
+        self,
+        jwks_uri: str,
+        audience: Optional[str],
+        issuer: Optional[str] = None,
+        leeway: int = 0,
+        require: Sequence[str] = ("exp",)
+    ):
+        self.jwks_uri = jwks_uri
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+        # Built once; "require" rejects tokens missing any listed claim in the same pass
+        self._options = {
+            "verify_exp": True,
+            "verify_aud": audience is not None,
+            "verify_iss": issuer is not None,
+            "require": list(require)
+        }
+
+    def verify(self, token: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Verify an RS256 token
+        Returns: (is_valid, claims) — on failure claims is None or {"error": ...}
+        """
+        # Recently verified tokens skip the signature check entirely
+        cache_key = (self.jwks_uri, self.audience, self.issuer, hashlib.sha256(token.encode()).digest()[:16]) \
+            if isinstance(token, str) else None
+        cached = _VERIFY_CACHE.get(cache_key)
+        if cached and time.time() < cached[0]:
+            return True, cached[1]
+
+        # Reject malformed tokens before any JWKS lookup or RSA work
+        unverified_header = _parse_token_header(token)
+        if unverified_header is None:
+            logger.error("Malformed token rejected")
+            return False, {"error": "Malformed token"}
+
+        try:
+            kid = unverified_header.get("kid")
+
+            public_key = self._get_public_key(kid)
+            if public_key is None:
+                logger.error(f"Unable to find a signing key that matches: {kid}")
+                return False, None
+
+            claims = jwt.decode(
+                token,
+                key=public_key,
+                algorithms=_DECODE_ALGORITHMS,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options=self._options
+            )
+
+            # Only successes are cached, so a transient JWKS miss can't stick
+            expires_at = min(float(claims.get("exp", 0)), time.time() + _VERIFY_CACHE_TTL)
+            with _VERIFY_LOCK:
+                _VERIFY_CACHE[cache_key] = (expires_at, claims)
+                if len(_VERIFY_CACHE) > _VERIFY_CACHE_MAX:
+                    _VERIFY_CACHE.pop(next(iter(_VERIFY_CACHE)), None)
+
+            return True, claims
+
+        except jwt.ExpiredSignatureError:
+            logger.error("Token has expired")
+            return False, {"error": "Token expired"}
+        except jwt.InvalidTokenError as e:
+            logger.error(f"Invalid token: {e}")
+            return False, {"error": str(e)}
+        except Exception as e:
+            logger.error(f"Token verification failed: {e}")
+            return False, {"error": str(e)}
+
+    def _get_jwks_entry(self) -> Optional[Dict[str, Any]]:
+        """Get the cached JWKS entry, fetching it when expired"""
+        entry = _JWKS_CACHE.get(self.jwks_uri)
+        now = time.time()
+        if entry and now < entry["expires_at"]:
+            if now >= entry["refresh_at"]:
+                _refresh_jwks_async(self.jwks_uri)
+            return entry
+
+        return _fetch_jwks(self.jwks_uri)
+
+    def _get_public_key(self, kid: Optional[str]):
+        """Return the parsed public key for kid, building it from the JWKS once
+
+        The memoized key is only trusted while the current JWKS entry is
+        unexpired and still publishes kid, so keys the provider rotates out or
+        revokes stop verifying once the JWKS is refreshed.
+        """
+        entry = self._get_jwks_entry()
+        keys_by_kid = entry["keys_by_kid"] if entry else {}
+        if kid in keys_by_kid:
+            public_key = _PUBLIC_KEYS.get((self.jwks_uri, kid))
+            if public_key is not None:
+                return public_key
+
+        public_key = self._find_public_key(kid, keys_by_kid)
+        if public_key is None:
+            # The provider may have rotated keys since the JWKS was cached
+            public_key = self._find_public_key(kid, _force_jwks_refresh(self.jwks_uri))
+        return public_key
+
+    def _find_public_key(self, kid: Optional[str], keys_by_kid: Dict[str, Dict[str, Any]]):
+        """Parse and memoize the key for kid from an indexed JWKS (None if absent)"""
+        key = keys_by_kid.get(kid)
+        if key is None or key.get("kty") != "RSA":
+            return None
+
+        # Build the RSA key straight from the modulus/exponent (no JWK JSON round trip)
+        public_key = rsa.RSAPublicNumbers(
+            int.from_bytes(_b64url_decode(key["e"]), "big"),
+            int.from_bytes(_b64url_decode(key["n"]), "big")
+        ).public_key()
+        _PUBLIC_KEYS[(self.jwks_uri, kid)] = public_key
+        return public_key
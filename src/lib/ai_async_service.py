@@ -5,13 +5,13 @@ Supports multiple AI providers (OpenAI, Groq, Local)
 
 import os
 import json
+import orjson
 import time
 import boto3
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Dict, Any, Optional, Tuple
 from enum import Enum
-import pytz
 from openai import OpenAI
 from lib.logger import logger
 from config.settings import settings
@@ -127,7 +127,7 @@ class AsyncAIService:
                 "description": description,
                 "image_url": image_url,
                 "callback_url": callback_url,
-                "timestamp": datetime.now(pytz.utc).isoformat(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
                 "provider": self.provider.value
             }
 
@@ -229,7 +229,7 @@ Return JSON: {"category": "...", "confidence": 0.0-1.0}"""
                 response_format={"type": "json_object"} if self.provider == AIProvider.OPENAI else None
             )
 
-            result = json.loads(response.choices[0].message.content)
+            result = orjson.loads(response.choices[0].message.content)
             tokens = response.usage.total_tokens if response.usage else 50
 
             logger.info(
@@ -300,7 +300,7 @@ Return JSON: {"category": "...", "confidence": 0.0-1.0}"""
                 response_format={"type": "json_object"} if self.provider == AIProvider.OPENAI else None
             )
 
-            result = json.loads(response.choices[0].message.content)
+            result = orjson.loads(response.choices[0].message.content)
             tokens = response.usage.total_tokens if response.usage else 500
 
             logger.info(
@@ -401,7 +401,7 @@ Return JSON: {"category": "...", "confidence": 0.0-1.0}"""
             self.db.update("app_analysis_results", entry_id, {
                 "status": "completed" if result.get("success") else "failed",
                 "result": json.dumps(result),
-                "completed_at": datetime.now(pytz.utc).isoformat()
+                "completed_at": datetime.now(timezone.utc).isoformat()
             })
         except Exception as e:
             logger.error(f"Failed to store result: {e}")
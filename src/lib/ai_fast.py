@@ -4,15 +4,21 @@ Optimized for speed with configurable models
 """
 
 import os
-import json
+import orjson
 import time
-from typing import Dict, Any, Optional
-import pytz
+from typing import Dict, Any, Optional, Tuple
 from openai import OpenAI
 from lib.logger import logger
 from config.settings import settings
 from utils.timestamps import utc_now
 
+# Cost tracking: model -> (input, output) USD per token (published per-1K rates / 1000)
+_MODEL_COSTS: Dict[str, Tuple[float, float]] = {
+    "gpt-5-mini": (0.00015 / 1000, 0.0006 / 1000),
+    "gpt-5.4": (0.0025 / 1000, 0.01 / 1000),
+}
+_DEFAULT_COST = (0.001 / 1000, 0.001 / 1000)
+
 
 class FastAIService:
     """Optimized AI Service for faster processing"""
@@ -37,12 +43,6 @@ class FastAIService:
         # Single-pass mode for better performance
         self.single_pass = os.environ.get("AI_SINGLE_PASS", "true").lower() == "true"
 
-        # Cost tracking (per 1K tokens)
-        self.model_costs = {
-            "gpt-5-mini": {"input": 0.00015, "output": 0.0006},
-            "gpt-5.4": {"input": 0.0025, "output": 0.01}
-        }
-
         logger.info(f"FastAIService initialized with model: {self.default_model}, single_pass: {self.single_pass}")
 
     def _get_combined_prompt(self, category: Optional[str] = None) -> str:
@@ -158,7 +158,7 @@ Be concise and accurate. If you cannot determine exact values, make reasonable e
                 response_format={"type": "json_object"}
             )
 
-            result = json.loads(response.choices[0].message.content)
+            result = orjson.loads(response.choices[0].message.content)
             tokens = response.usage.total_tokens if response.usage else 0
 
             processing_time = time.time() - start_time
@@ -243,12 +243,12 @@ Be concise and accurate. If you cannot determine exact values, make reasonable e
 
     def _calculate_cost(self, tokens: int) -> float:
         """Calculate cost based on tokens"""
-        costs = self.model_costs.get(self.default_model, {"input": 0.001, "output": 0.001})
+        per_token_in, per_token_out = _MODEL_COSTS.get(self.default_model, _DEFAULT_COST)
         # Approximate 70/30 split for input/output
         input_tokens = int(tokens * 0.7)
         output_tokens = int(tokens * 0.3)
 
-        cost = (input_tokens * costs["input"] / 1000) + (output_tokens * costs["output"] / 1000)
+        cost = input_tokens * per_token_in + output_tokens * per_token_out
         return round(cost, 6)
 
     def _log_cost(self, user_id: str, function_name: str, category: str, tokens: int, cost: float):
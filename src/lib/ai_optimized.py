@@ -5,56 +5,67 @@ Optimized AI Service with Two-Stage Processing
 """
 
 import os
+import re
 import json
 import time
-from datetime import datetime, timedelta
+import queue
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta, timezone
 from utils.timestamps import utc_now
 from typing import Dict, Any, Optional, Tuple
-import pytz
+import httpx
+import orjson
 from openai import OpenAI
 from lib.logger import logger
-from lib.model_manager import get_model_manager
+from lib.model_manager import ModelConfig, get_model_manager
 
+# OpenAI-compatible clients shared across service instances so warm containers
+# reuse connections: (provider, api key hash) -> client
+_CLIENT_POOL: Dict[Tuple[str, str], OpenAI] = {}
+_CLIENT_POOL_LOCK = threading.Lock()
 
-class OptimizedAIService:
-    """AI Service with intelligent two-stage processing using ModelManager"""
+# Cost log entries collected during a request: items are (db client, entry),
+# written in batches per client before process_request returns. Lambda freezes
+# background threads between invocations and skips atexit on teardown, so
+# nothing may be left queued once the response is handed back
+_COST_QUEUE: "queue.Queue[Tuple[Any, Dict[str, Any]]]" = queue.Queue(maxsize=1000)
 
-    def __init__(self, db_client):
-        self.db = db_client
-        self.model_manager = get_model_manager(db_client)
-        self._clients = {}  # Cache clients by provider
 
-        self.default_model_config = self.model_manager.get_model_config("food")
-        
-        # Option to skip classification for better performance
-        self.skip_classification = os.environ.get("SKIP_AI_CLASSIFICATION", "false").lower() == "true"
+def _write_cost_batch(batch: list):
+    """Write queued cost entries with one db.write per client"""
+    by_db: Dict[int, Tuple[Any, list]] = {}
+    for db, entry in batch:
+        # app_api_costs.model_used is a string column; encode off the request path
+        entry["model_used"] = orjson.dumps(entry["model_used"]).decode()
+        by_db.setdefault(id(db), (db, []))[1].append(entry)
 
-        logger.info("OptimizedAIService initialized with ModelManager")
+    for db, entries in by_db.values():
+        try:
+            db.write("app_api_costs", entries)
+        except Exception as e:
+            logger.error(f"Failed to log {len(entries)} cost entries: {e}")
 
-    def _get_client(self, provider: str) -> OpenAI:
-        """Get or create OpenAI-compatible client for provider"""
-        if provider in self._clients:
-            return self._clients[provider]
-            
-        api_key = self.model_manager.get_api_key(provider)
-        provider_config = self.model_manager.get_provider_config(provider)
-        base_url = provider_config.get("base_url")
-        
-        if not api_key:
-             raise ValueError(f"API key required for provider {provider}")
 
-        client = OpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            timeout=60.0,
-            max_retries=2
-        )
-        self._clients[provider] = client
-        return client
+def _flush_cost_queue():
+    """Write everything still queued (called at the end of every request)"""
+    batch = []
+    while True:
+        try:
+            batch.append(_COST_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    if batch:
+        _write_cost_batch(batch)
+
+
+# Shared pool for overlapping independent I/O (e.g. prompt lookup during classification)
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai-optimized")
 
-    def _get_classification_prompt(self) -> str:
-        """Get the prompt for content classification"""
-        return """You are an expert content classifier. Analyze the content and determine its category.
+# Stage 1 classifier system prompt; the system message is built once and shared
+CLASSIFY_SYSTEM_PROMPT = """You are an expert content classifier. Analyze the content and determine its category.
 
 CATEGORIES (choose exactly one):
 
@@ -87,26 +98,240 @@ Return ONLY a JSON object with:
     "reasoning": "brief explanation of your decision"
 }"""
 
+_CLASSIFY_SYSTEM_MESSAGE = {"role": "system", "content": CLASSIFY_SYSTEM_PROMPT}
+
+# Built-in prompts used when neither the DB nor the prompt files provide one
+_FALLBACK_PROMPTS: Dict[str, Dict[str, str]] = {
+    "food": {
+        "system_prompt": "You are an expert nutritionist. Analyze food and provide detailed nutritional information. Return valid JSON.",
+        "user_prompt_template": "Analyze this food: {description}"
+    },
+    "receipt": {
+        "system_prompt": (
+            "You are a receipt/purchase parser. Extract purchase details and return valid JSON with these fields:\n"
+            "- merchant_name: the STORE or BRAND name (e.g. 'OLD Navy', 'Walmart', 'Starbucks'). NEVER use a country, city, or address as merchant_name.\n"
+            "- purchase_date: date in YYYY-MM-DD format, use today's date if not specified\n"
+            "- financial_summary: {total_amount, subtotal, tax_amount, discount_amount, currency}\n"
+            "- items: array of {name, quantity, unit_price, total_price, category}\n"
+            "- payment_method: cash/card/etc if mentioned\n"
+            "Fill in reasonable values from context. Never use placeholder text like 'string' or 'YYYY-MM-DD'."
+        ),
+        "user_prompt_template": "Parse this purchase/receipt: {description}"
+    },
+    "workout": {
+        "system_prompt": (
+            "You are a fitness tracker. Extract workout details and return valid JSON with these fields:\n"
+            "- workout_type: type of workout (e.g. 'Running', 'Weight Training', 'Yoga', 'HIIT', 'General')\n"
+            "- duration_minutes: total duration in minutes as a number (estimate if not stated)\n"
+            "- calories_burned: estimated calories burned as a number\n"
+            "- intensity_level: 'low', 'moderate', or 'high'\n"
+            "- muscle_groups: comma-separated list of muscle groups worked\n"
+            "- notes: brief summary of the workout\n"
+            "- exercises: array of objects with {name, sets, reps, weight_lbs, distance_miles, duration_seconds, calories_burned}\n"
+            "Fill in reasonable estimates. Never use placeholder text."
+        ),
+        "user_prompt_template": "Analyze this workout: {description}"
+    },
+}
+_DEFAULT_FALLBACK_PROMPT = {
+    "system_prompt": "You are a helpful AI assistant. Return valid JSON.",
+    "user_prompt_template": "Analyze this: {description}"
+}
+
+# OpenAI prompt-cache routing keys; bump the version suffix whenever the
+# corresponding system prompt changes
+_PROMPT_CACHE_KEY_VERSION = "v1"
+
+# Loaded prompts per tenant: (tenant_id, namespace, category) -> (prompt config,
+# loaded_at epoch). Each tenant has its own app_prompts table
+_PROMPT_CACHE: Dict[Tuple[str, str, str], Tuple[Dict[str, str], float]] = {}
+_PROMPT_CACHE_TTL = 300  # 5 minutes
+_PROMPT_CATEGORIES = ("food", "receipt", "workout")
+
+# In-flight LLM classifications keyed by (tenant_id, namespace, description,
+# image_url); concurrent identical requests from the same tenant wait on the
+# first call instead of issuing their own, but never longer than the timeout
+_CLASSIFY_INFLIGHT: Dict[Tuple[str, str, Optional[str], Optional[str]], Future] = {}
+_CLASSIFY_LOCK = threading.Lock()
+_CLASSIFY_WAIT_TIMEOUT = 30  # seconds
+
+# Presigned image URLs from IbexDB get_download_url: (tenant_id, namespace, key)
+# -> (url, resolved_at epoch). IbexDB checks tenant ownership of the key, so a
+# URL is only ever reused by the tenant it was minted for. URLs are minted for
+# an hour, so reusing them for 10 minutes is always safe
+_PRESIGN_CACHE: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+_PRESIGN_CACHE_TTL = 600  # 10 minutes
+_PRESIGN_CACHE_MAX = 1024
+_PRESIGN_EXPIRES_IN = 3600
+_LEGACY_UPLOAD_BUCKET = 'nutriwealth-uploads'
+
+# Feature flags, read once per container (the service is built per request)
+# Option to skip classification for better performance
+_SKIP_AI_CLASSIFICATION = os.environ.get("SKIP_AI_CLASSIFICATION", "false").lower() == "true"
+# Option to classify and analyze in one call when the analyzer can do both
+_AI_SINGLE_STAGE = os.environ.get("AI_SINGLE_STAGE", "false").lower() == "true"
+# Option to classify every text-only request locally and reserve the
+# remote classifier for requests with images
+_AI_LOCAL_TEXT_CLASSIFICATION = os.environ.get("AI_LOCAL_TEXT_CLASSIFICATION", "false").lower() == "true"
+
+
+# Successful analyses keyed by blake2b(tenant_id|namespace|user_id|description|image_url)
+# -> (result, stored_at epoch); absorbs retries and duplicate submits without any
+# LLM calls. Results depend on the tenant's prompts and models, so they are never
+# shared across tenants or users
+_RESULT_CACHE: Dict[bytes, Tuple[Dict[str, Any], float]] = {}
+_RESULT_CACHE_TTL = 300  # 5 minutes
+_RESULT_CACHE_MAX = 2048
+_RESULT_CACHE_LOCK = threading.Lock()
+
+# Placeholder descriptions that carry no classification signal
+_RE_GENERIC_DESCRIPTION = re.compile(
+    r"\s*(?:ai-analyzed content|food|meal|none|image|photo)?\s*", re.IGNORECASE
+)
+
+# Fallback keyword scans (substring semantics, one regex pass per category)
+_RE_RECEIPT = re.compile(r"receipt|invoice|bill|purchase|store|walmart|target|trader", re.IGNORECASE)
+_RE_WORKOUT = re.compile(r"workout|exercise|gym|fitness|run|jog", re.IGNORECASE)
+_RE_FOOD = re.compile(r"food|meal|eat|drink|calories|breakfast|lunch|dinner", re.IGNORECASE)
+
+# Whole-word cues strong enough to classify text-only requests without an LLM call
+_DETERMINISTIC_PATTERNS = {
+    category: re.compile(r"\b(?:" + "|".join(words) + r")s?\b", re.IGNORECASE)
+    for category, words in {
+        "receipt": ("receipt", "invoice", "bill", "purchase"),
+        "workout": ("workout", "exercise", "gym", "fitness"),
+        "food": ("breakfast", "lunch", "dinner", "meal", "calories"),
+    }.items()
+}
+
+# Looser substring cues: a text is only unambiguous when no other category's
+# cue appears anywhere in it (e.g. "protein shake after gym" goes to the model)
+_CATEGORY_HINTS = {
+    "receipt": _RE_RECEIPT,
+    "workout": _RE_WORKOUT,
+    "food": re.compile(_RE_FOOD.pattern + r"|snack|protein|shake|smoothie|coffee", re.IGNORECASE),
+}
+
+
+class OptimizedAIService:
+    """AI Service with intelligent two-stage processing using ModelManager"""
+
+    def __init__(self, db_client):
+        self.db = db_client
+        self.model_manager = get_model_manager(db_client)
+
+        self.default_model_config = self.model_manager.get_model_config("food")
+        
+        self.skip_classification = _SKIP_AI_CLASSIFICATION
+        self.single_stage = _AI_SINGLE_STAGE
+        self.local_text_classification = _AI_LOCAL_TEXT_CLASSIFICATION
+
+        logger.info("OptimizedAIService initialized with ModelManager")
+
+    def _get_client(self, provider: str) -> OpenAI:
+        """Get or create OpenAI-compatible client for provider"""
+        api_key = self.model_manager.get_api_key(provider)
+        if not api_key:
+            raise ValueError(f"API key required for provider {provider}")
+
+        key = (provider, hashlib.sha1(api_key.encode()).hexdigest()[:12])
+        client = _CLIENT_POOL.get(key)
+        if client is not None:
+            return client
+
+        with _CLIENT_POOL_LOCK:
+            client = _CLIENT_POOL.get(key)
+            if client is None:
+                provider_config = self.model_manager.get_provider_config(provider)
+                client = OpenAI(
+                    api_key=api_key,
+                    base_url=provider_config.get("base_url"),
+                    timeout=60.0,
+                    max_retries=2,
+                    http_client=httpx.Client(
+                        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+                    )
+                )
+                _CLIENT_POOL[key] = client
+        return client
+
+    @staticmethod
+    def _prompt_cache_kwargs(provider: str, stage: str) -> Dict[str, Any]:
+        """Route same-prefix OpenAI requests to one cache bucket (sent via extra_body
+        so older SDK versions accept it; other providers don't support the field)"""
+        if provider != "openai":
+            return {}
+        return {"extra_body": {"prompt_cache_key": f"ajna-{stage}-{_PROMPT_CACHE_KEY_VERSION}"}}
+
+    @staticmethod
+    def _image_parts(image_url: Optional[str]) -> Tuple[Dict[str, Any], ...]:
+        """Build the image content part once so both stages can share it"""
+        if not image_url:
+            return ()
+        return ({"type": "image_url", "image_url": {"url": image_url}},)
+
     def _classify_content(
         self,
         description: Optional[str],
-        image_url: Optional[str]
+        image_url: Optional[str],
+        image_parts: Optional[Tuple[Dict[str, Any], ...]] = None,
+        config: Optional[ModelConfig] = None
     ) -> Tuple[str, float, int]:
         """
         Intelligently classify content
         """
+        # Text-only requests with an unambiguous keyword match skip the LLM round trip
+        if description and not image_url:
+            category = self._deterministic_category(description)
+            if category:
+                logger.debug("Content classified by keyword fast path", category=category)
+                return (category, 0.95, 0)
+            if self.local_text_classification:
+                return self._keyword_classify(description)
+
+        key = (self.db.tenant_id, self.db.namespace, description, image_url)
+        with _CLASSIFY_LOCK:
+            future = _CLASSIFY_INFLIGHT.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = _CLASSIFY_INFLIGHT[key] = Future()
+
+        if not is_owner:
+            try:
+                # Tokens were spent (and billed) by the owning request
+                category, confidence, _ = future.result(timeout=_CLASSIFY_WAIT_TIMEOUT)
+                return (category, confidence, 0)
+            except FutureTimeoutError:
+                logger.warning("Shared classification timed out, classifying directly")
+                return self._classify_with_llm(description, image_url, image_parts, config)
+
+        try:
+            result = self._classify_with_llm(description, image_url, image_parts, config)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _CLASSIFY_LOCK:
+                _CLASSIFY_INFLIGHT.pop(key, None)
+
+    def _classify_with_llm(
+        self,
+        description: Optional[str],
+        image_url: Optional[str],
+        image_parts: Optional[Tuple[Dict[str, Any], ...]] = None,
+        config: Optional[ModelConfig] = None
+    ) -> Tuple[str, float, int]:
+        """Classify content with the configured classifier model"""
         start_time = time.time()
-        
-        # Get config for classifier
-        config = self.model_manager.get_model_config("classifier")
+
+        # Get config for classifier (callers normally pass the one they already hold)
+        if config is None:
+            config = self.model_manager.get_model_config("classifier")
         client = self._get_client(config.provider)
 
         # Build classification prompt
-        messages = [
-            {"role": "system", "content": self._get_classification_prompt()},
-            {"role": "user", "content": []}
-        ]
-
         user_content = []
 
         # Add description if provided
@@ -117,11 +342,9 @@ Return ONLY a JSON object with:
             })
 
         # Add image if provided (should already be resolved to presigned URL by caller)
-        if image_url:
-            user_content.append({
-                "type": "image_url",
-                "image_url": {"url": image_url}
-            })
+        if image_parts is None:
+            image_parts = self._image_parts(image_url)
+        user_content.extend(image_parts)
 
         # Add instruction
         user_content.append({
@@ -129,7 +352,7 @@ Return ONLY a JSON object with:
             "text": "Classify this content into the appropriate category."
         })
 
-        messages[1]["content"] = user_content
+        messages = [_CLASSIFY_SYSTEM_MESSAGE, {"role": "user", "content": user_content}]
 
         try:
             # Use configured model for classification
@@ -138,6 +361,7 @@ Return ONLY a JSON object with:
                 messages=messages,
                 **config.temperature_kwargs(),
                 **config.token_kwargs(),
+                **self._prompt_cache_kwargs(config.provider, "classifier"),
                 response_format={"type": "json_object"}
             )
 
@@ -149,7 +373,7 @@ Return ONLY a JSON object with:
                 logger.warning("Classification returned empty content, falling back to keyword classification")
                 return self._keyword_classify(description, has_image=bool(image_url))
 
-            result = json.loads(content)
+            result = orjson.loads(content)
 
             logger.debug(
                 "Content classified",
@@ -174,46 +398,122 @@ Return ONLY a JSON object with:
             logger.error(f"Classification failed: {e}")
             return self._keyword_classify(description, has_image=bool(image_url))
 
+    @staticmethod
+    def _deterministic_category(description: str) -> Optional[str]:
+        """Return the category when exactly one category's cues match, else None"""
+        matched = [c for c, pattern in _DETERMINISTIC_PATTERNS.items() if pattern.search(description)]
+        if len(matched) != 1:
+            return None
+        category = matched[0]
+        for other, pattern in _CATEGORY_HINTS.items():
+            if other != category and pattern.search(description):
+                return None
+        return category
+
     def _keyword_classify(self, description: Optional[str], has_image: bool = False) -> Tuple[str, float, int]:
         """Fallback keyword-based classification when AI classification fails"""
-        if description:
-            desc_lower = description.lower()
-            # Filter out generic/placeholder descriptions
-            GENERIC = {'ai-analyzed content', 'food', 'meal', '', 'none', 'image', 'photo'}
-            if desc_lower.strip() not in GENERIC:
-                if any(w in desc_lower for w in ["receipt", "invoice", "bill", "purchase", "store", "walmart", "target", "trader"]):
-                    return ("receipt", 0.6, 0)
-                elif any(w in desc_lower for w in ["workout", "exercise", "gym", "fitness", "run", "jog"]):
-                    return ("workout", 0.6, 0)
-                elif any(w in desc_lower for w in ["food", "meal", "eat", "drink", "calories", "breakfast", "lunch", "dinner"]):
-                    return ("food", 0.6, 0)
+        # Filter out generic/placeholder descriptions
+        if description and not _RE_GENERIC_DESCRIPTION.fullmatch(description):
+            if _RE_RECEIPT.search(description):
+                return ("receipt", 0.6, 0)
+            elif _RE_WORKOUT.search(description):
+                return ("workout", 0.6, 0)
+            elif _RE_FOOD.search(description):
+                return ("food", 0.6, 0)
         # When AI vision failed and description is generic, default to receipt
         # (most image uploads without specific food descriptions are receipts)
         if has_image:
             return ("receipt", 0.4, 0)
         return ("food", 0.4, 0)
 
-    def _load_prompt(self, category: str) -> Dict[str, str]:
-        """Load prompt for specific category"""
-        # (Same implementation as before)
-        # Try database first
+    def _query_active_prompts(self) -> Optional[Dict[str, Dict[str, str]]]:
+        """Fetch all active DB prompts in one query, keyed by category (None on failure)"""
         try:
             res = self.db.query("app_prompts", filters=[
-                {"field": "category", "operator": "eq", "value": category},
                 {"field": "is_active", "operator": "eq", "value": True}
-            ], limit=1, include_deleted=False)
+            ], limit=100, include_deleted=False)
 
             if res and res.get('success'):
-                data = res.get('data', {})
-                records = data.get('records', [])
-                if records:
-                    prompt = records[0]
-                    return {
+                prompts = {}
+                for prompt in res.get('data', {}).get('records', []):
+                    prompts.setdefault(prompt.get("category"), {
                         "system_prompt": prompt.get("system_prompt"),
                         "user_prompt_template": prompt.get("user_prompt_template")
-                    }
+                    })
+                return prompts
         except Exception as e:
-            logger.warning(f"Failed to load prompt from DB: {e}")
+            logger.warning(f"Failed to prefetch prompts from DB: {e}")
+
+        return None
+
+    @staticmethod
+    def invalidate_prompts():
+        """Drop cached prompts so the next request reloads them (call after admin edits)"""
+        _PROMPT_CACHE.clear()
+
+    def _prompt_cache_key(self, category: str) -> Tuple[str, str, str]:
+        return (self.db.tenant_id, self.db.namespace, category)
+
+    def _prompts_cached(self) -> bool:
+        """True when every category prompt for this tenant is cached and fresh"""
+        now = time.time()
+        for category in _PROMPT_CATEGORIES:
+            entry = _PROMPT_CACHE.get(self._prompt_cache_key(category))
+            if not entry or now - entry[1] >= _PROMPT_CACHE_TTL:
+                return False
+        return True
+
+    def _load_prompt(
+        self,
+        category: str,
+        db_prompts: Optional[Dict[str, Dict[str, str]]] = None
+    ) -> Dict[str, str]:
+        """Load prompt for specific category, cached per tenant for _PROMPT_CACHE_TTL seconds"""
+        key = self._prompt_cache_key(category)
+        entry = _PROMPT_CACHE.get(key)
+        if entry and time.time() - entry[1] < _PROMPT_CACHE_TTL:
+            return entry[0]
+
+        prompt, db_ok = self._load_prompt_uncached(category, db_prompts)
+        # A fallback served because the DB was unreachable must not be pinned for the TTL
+        if db_ok:
+            _PROMPT_CACHE[key] = (prompt, time.time())
+        return prompt
+
+    def _load_prompt_uncached(
+        self,
+        category: str,
+        db_prompts: Optional[Dict[str, Dict[str, str]]] = None
+    ) -> Tuple[Dict[str, str], bool]:
+        """
+        Load prompt from DB, then files, then built-in defaults (db_prompts: result of _query_active_prompts)
+
+        Returns (prompt config, whether the DB lookup succeeded).
+        """
+        # Try database first
+        db_ok = db_prompts is not None
+        if db_ok:
+            if category in db_prompts:
+                return db_prompts[category], True
+        else:
+            try:
+                res = self.db.query("app_prompts", filters=[
+                    {"field": "category", "operator": "eq", "value": category},
+                    {"field": "is_active", "operator": "eq", "value": True}
+                ], limit=1, include_deleted=False)
+
+                if res and res.get('success'):
+                    db_ok = True
+                    data = res.get('data', {})
+                    records = data.get('records', [])
+                    if records:
+                        prompt = records[0]
+                        return {
+                            "system_prompt": prompt.get("system_prompt"),
+                            "user_prompt_template": prompt.get("user_prompt_template")
+                        }, True
+            except Exception as e:
+                logger.warning(f"Failed to load prompt from DB: {e}")
 
         # Load from files
         try:
@@ -239,53 +539,23 @@ Return ONLY a JSON object with:
                 return {
                     "system_prompt": system_prompt,
                     "user_prompt_template": user_template
-                }
+                }, db_ok
         except Exception as e:
             logger.warning(f"Failed to load prompt from files: {e}")
 
-        # Fallback prompts (Same as before)
-        if category == "food":
-            return {
-                "system_prompt": "You are an expert nutritionist. Analyze food and provide detailed nutritional information. Return valid JSON.",
-                "user_prompt_template": "Analyze this food: {description}"
-            }
-        elif category == "receipt":
-            return {
-                "system_prompt": (
-                    "You are a receipt/purchase parser. Extract purchase details and return valid JSON with these fields:\n"
-                    "- merchant_name: the STORE or BRAND name (e.g. 'OLD Navy', 'Walmart', 'Starbucks'). NEVER use a country, city, or address as merchant_name.\n"
-                    "- purchase_date: date in YYYY-MM-DD format, use today's date if not specified\n"
-                    "- financial_summary: {total_amount, subtotal, tax_amount, discount_amount, currency}\n"
-                    "- items: array of {name, quantity, unit_price, total_price, category}\n"
-                    "- payment_method: cash/card/etc if mentioned\n"
-                    "Fill in reasonable values from context. Never use placeholder text like 'string' or 'YYYY-MM-DD'."
-                ),
-                "user_prompt_template": "Parse this purchase/receipt: {description}"
-            }
-        elif category == "workout":
-            return {
-                "system_prompt": (
-                    "You are a fitness tracker. Extract workout details and return valid JSON with these fields:\n"
-                    "- workout_type: type of workout (e.g. 'Running', 'Weight Training', 'Yoga', 'HIIT', 'General')\n"
-                    "- duration_minutes: total duration in minutes as a number (estimate if not stated)\n"
-                    "- calories_burned: estimated calories burned as a number\n"
-                    "- intensity_level: 'low', 'moderate', or 'high'\n"
-                    "- muscle_groups: comma-separated list of muscle groups worked\n"
-                    "- notes: brief summary of the workout\n"
-                    "- exercises: array of objects with {name, sets, reps, weight_lbs, distance_miles, duration_seconds, calories_burned}\n"
-                    "Fill in reasonable estimates. Never use placeholder text."
-                ),
-                "user_prompt_template": "Analyze this workout: {description}"
-            }
+        return _FALLBACK_PROMPTS.get(category, _DEFAULT_FALLBACK_PROMPT), db_ok
 
-        return {
-            "system_prompt": "You are a helpful AI assistant. Return valid JSON.",
-            "user_prompt_template": "Analyze this: {description}"
-        }
+    # (minute bucket, formatted context) — the string only changes once a minute
+    _tc_cache: Tuple[int, str] = (0, "")
 
     def _get_time_context(self) -> str:
         """Get current time context for meal type hints"""
-        now = datetime.now(pytz.utc)
+        bucket = int(time.time() // 60)
+        cached_bucket, cached_context = OptimizedAIService._tc_cache
+        if bucket == cached_bucket:
+            return cached_context
+
+        now = datetime.fromtimestamp(bucket * 60, timezone.utc)
         hour = now.hour
 
         meal_hint = 'snack'
@@ -296,10 +566,12 @@ Return ONLY a JSON object with:
         elif 17 <= hour < 22:
             meal_hint = 'dinner'
 
-        return f"Current UTC time: {now.strftime('%H:%M')}. Time-based meal hint: {meal_hint}. But prioritize food content over time."
+        context = f"Current UTC time: {now.strftime('%H:%M')}. Time-based meal hint: {meal_hint}. But prioritize food content over time."
+        OptimizedAIService._tc_cache = (bucket, context)
+        return context
 
     def _resolve_image_url(self, image_url: str) -> str:
-        """Resolve S3 key to presigned download URL via IbexDB SDK."""
+        """Resolve S3 key to a presigned download URL via IbexDB (memoized per tenant)."""
         if not image_url or not isinstance(image_url, str):
             return image_url
 
@@ -307,25 +579,39 @@ Return ONLY a JSON object with:
         if image_url.startswith('http://') or image_url.startswith('https://') or image_url.startswith('data:'):
             return image_url
 
-        # S3 key — resolve via IbexDB
-        logger.info(f"Resolving S3 key to presigned URL via IbexDB: {image_url}")
-        try:
-            # Legacy keys (uploads/{user_id}/...) are in the old bucket
-            bucket = None
-            if image_url.startswith('uploads/') and not image_url.startswith('tenants/'):
-                bucket = 'nutriwealth-uploads'
+        cache_key = (self.db.tenant_id, self.db.namespace, image_url)
+        cached = _PRESIGN_CACHE.get(cache_key)
+        if cached and time.time() - cached[1] < _PRESIGN_CACHE_TTL:
+            return cached[0]
+
+        # Legacy keys (uploads/{user_id}/...) are in the old bucket
+        bucket = None
+        if image_url.startswith('uploads/') and not image_url.startswith('tenants/'):
+            bucket = _LEGACY_UPLOAD_BUCKET
+
+        url = self._presign_via_ibex(image_url, bucket)
+        if not url:
+            return image_url
 
-            res = self.db.get_download_url(image_url, expires_in=3600, bucket=bucket)
+        if len(_PRESIGN_CACHE) >= _PRESIGN_CACHE_MAX:
+            _PRESIGN_CACHE.clear()
+        _PRESIGN_CACHE[cache_key] = (url, time.time())
+        return url
+
+    def _presign_via_ibex(self, key: str, bucket: Optional[str]) -> Optional[str]:
+        """Ask IbexDB to mint a presigned download URL for the key."""
+        logger.info(f"Resolving S3 key to presigned URL via IbexDB: {key}")
+        try:
+            res = self.db.get_download_url(key, expires_in=_PRESIGN_EXPIRES_IN, bucket=bucket)
             if res.get('success'):
                 url = res.get('data', {}).get('download_url', '')
                 if url:
                     logger.info("Successfully resolved S3 key to presigned download URL")
                     return url
-            logger.error(f"IbexDB get_download_url failed for key={image_url}: {res.get('error', 'unknown')}")
+            logger.error(f"IbexDB get_download_url failed for key={key}: {res.get('error', 'unknown')}")
         except Exception as e:
             logger.error(f"Error resolving image URL via IbexDB: {e}")
-
-        return image_url
+        return None
 
     def process_request(
         self,
@@ -337,27 +623,80 @@ Return ONLY a JSON object with:
         Process analysis request with two-stage approach
         Stage 1: Fast classification
         Stage 2: Detailed analysis with appropriate model
+
+        Identical (description, image) submissions from the same user and tenant
+        within the cache TTL return the stored result with metadata["cache_hit"] set.
         """
+        cache_key = hashlib.blake2b(
+            "\x1f".join((
+                self.db.tenant_id or "", self.db.namespace or "", user_id or "",
+                description or "", image_url or ""
+            )).encode(),
+            digest_size=16
+        ).digest()
+        cached = _RESULT_CACHE.get(cache_key)
+        if cached and time.time() - cached[1] < _RESULT_CACHE_TTL:
+            logger.info(f"Returning cached analysis for user {user_id}")
+            result = dict(cached[0])
+            result["metadata"] = {**result.get("metadata", {}), "cache_hit": True}
+            return result
+
+        try:
+            result = self._process_request_uncached(user_id, description, image_url)
+        finally:
+            # Cost rows must be written while this invocation is still running
+            _flush_cost_queue()
+        if result.get("success"):
+            with _RESULT_CACHE_LOCK:
+                if len(_RESULT_CACHE) >= _RESULT_CACHE_MAX:
+                    # Dicts keep insertion order: drop the oldest entry
+                    _RESULT_CACHE.pop(next(iter(_RESULT_CACHE)), None)
+                _RESULT_CACHE[cache_key] = (result, time.time())
+        return result
+
+    def _process_request_uncached(
+        self,
+        user_id: str,
+        description: Optional[str],
+        image_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Run the two-stage (or single-stage) analysis without the result cache."""
         start_time = time.time()
         total_tokens = 0
         total_cost = 0.0
 
         try:
+            # Prompt lookup doesn't depend on Stage 1 — overlap its DB round trip
+            # with image resolution and classification (skipped once this tenant's prompts are cached)
+            prompts_future = None if self._prompts_cached() else _EXECUTOR.submit(self._query_active_prompts)
+
             # Resolve image URL if needed
             resolved_image_url = self._resolve_image_url(image_url)
+            # Shared by both stages instead of rebuilding the image dicts per stage
+            image_parts = self._image_parts(resolved_image_url)
+
+            # Fetched once and threaded through classification and cost accounting
+            classifier_config = self.model_manager.get_model_config("classifier")
+
+            if self.single_stage and not self.skip_classification:
+                analyzer_config = self.model_manager.get_model_config("food")
+                has_image = bool(resolved_image_url)
+                if (self._use_single_stage(classifier_config, analyzer_config, has_image)
+                        and (has_image or not self._deterministic_category(description or ""))):
+                    return self._process_single_stage(
+                        user_id, description, image_parts, analyzer_config, start_time,
+                        prompts_future.result() if prompts_future else None
+                    )
 
             # Stage 1: Classification
             logger.info(f"Starting two-stage analysis for user {user_id}")
 
             category, confidence, classifier_tokens = self._classify_content(
-                description, resolved_image_url
+                description, resolved_image_url, image_parts, classifier_config
             )
 
             total_tokens += classifier_tokens
-            
-            # Get classifier config for cost
-            classifier_config = self.model_manager.get_model_config("classifier")
-            
+
             # Calculate classifier cost
             classifier_cost = (classifier_tokens / 1000) * classifier_config.cost_per_1k_tokens
             total_cost += classifier_cost
@@ -378,7 +717,9 @@ Return ONLY a JSON object with:
             client = self._get_client(config.provider)
 
             # Load appropriate prompt
-            prompt_config = self._load_prompt(category)
+            prompt_config = self._load_prompt(
+                category, prompts_future.result() if prompts_future else None
+            )
             system_prompt = prompt_config['system_prompt']
             user_template = prompt_config['user_prompt_template']
 
@@ -402,46 +743,27 @@ Return ONLY a JSON object with:
                 {"role": "user", "content": []}
             ]
 
-            content_parts = [{"type": "text", "text": full_user_prompt}]
-
-            if resolved_image_url:
-                content_parts.append({
-                    "type": "image_url",
-                    "image_url": {"url": resolved_image_url}
-                })
-
-            messages[1]["content"] = content_parts
+            messages[1]["content"] = [{"type": "text", "text": full_user_prompt}, *image_parts]
 
             # Call API for detailed analysis
             logger.debug(f"Starting detailed analysis with model: {config.model_name} (Provider: {config.provider})")
 
-            # Use structured outputs for receipts with OpenAI models that support it
+            # Use structured outputs with OpenAI models that support it: schema-
+            # conforming output needs no parse retries and carries no commentary
             response_format = {"type": "json_object"}  # Default
-            if category == "receipt" and config.provider == "openai" and any(p in config.model_name for p in ("gpt-4o", "gpt-5")):
-                try:
-                    from schemas.receipt_schema import RECEIPT_RESPONSE_SCHEMA
-                    response_format = {
-                        "type": "json_schema",
-                        "json_schema": {
-                            "name": "receipt_extraction",
-                            "strict": True,
-                            "schema": RECEIPT_RESPONSE_SCHEMA
-                        }
-                    }
-                    logger.info(f"Using structured outputs with schema for receipt analysis")
-                except ImportError:
-                    logger.warning("Could not import receipt schema, falling back to simple JSON mode")
+            if config.provider == "openai" and any(p in config.model_name for p in ("gpt-4o", "gpt-5")):
+                response_format = self._structured_response_format(category) or response_format
 
-            completion = client.chat.completions.create(
+            analysis_text, analysis_tokens = self._create_completion(
+                client,
+                config,
                 model=config.model_name,
                 messages=messages,
                 **config.temperature_kwargs(),
                 **config.token_kwargs(),
+                **self._prompt_cache_kwargs(config.provider, category),
                 response_format=response_format
             )
-
-            analysis_text = completion.choices[0].message.content
-            analysis_tokens = completion.usage.total_tokens if completion.usage else 0
             total_tokens += analysis_tokens
 
             # Handle None/empty analysis response (e.g. reasoning model ran out of tokens)
@@ -456,7 +778,7 @@ Return ONLY a JSON object with:
 
             # Parse result with retry logic for receipts
             try:
-                analysis_result = json.loads(analysis_text)
+                analysis_result = orjson.loads(analysis_text)
             except json.JSONDecodeError as e:
                 logger.error(f"JSON parse error for {category}: {str(e)}")
                 logger.error(f"Raw response (first 500 chars): {analysis_text[:500]}")
@@ -474,6 +796,7 @@ Return ONLY a JSON object with:
                         messages=retry_messages,
                         **config.temperature_kwargs(0),  # Use zero temperature for retry
                         **config.token_kwargs(),
+                        **self._prompt_cache_kwargs(config.provider, category),
                         response_format=response_format
                     )
 
@@ -481,7 +804,7 @@ Return ONLY a JSON object with:
                     total_tokens += retry_completion.usage.total_tokens
 
                     try:
-                        analysis_result = json.loads(retry_text)
+                        analysis_result = orjson.loads(retry_text)
                         logger.info("Retry successful - valid JSON received")
                     except json.JSONDecodeError as retry_error:
                         logger.error(f"Retry also failed: {str(retry_error)}")
@@ -548,6 +871,175 @@ Return ONLY a JSON object with:
                 "category": "unknown"
             }
 
+    @staticmethod
+    def _structured_response_format(category: str) -> Optional[Dict[str, Any]]:
+        """Strict json_schema response_format for the category, or None if it has no schema"""
+        try:
+            if category == "receipt":
+                from schemas.receipt_schema import RECEIPT_RESPONSE_SCHEMA as schema
+                name = "receipt_extraction"
+            elif category == "food":
+                from schemas.food_schema import FOOD_RESPONSE_SCHEMA as schema
+                name = "food_analysis"
+            elif category == "workout":
+                from schemas.workout_schema import WORKOUT_RESPONSE_SCHEMA as schema
+                name = "workout_analysis"
+            else:
+                return None
+        except ImportError:
+            logger.warning(f"Could not import {category} schema, falling back to simple JSON mode")
+            return None
+
+        logger.info(f"Using structured outputs with schema for {category} analysis")
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": name,
+                "strict": True,
+                "schema": schema
+            }
+        }
+
+    @staticmethod
+    def _create_completion(client: OpenAI, config, **kwargs) -> Tuple[Optional[str], int]:
+        """Run a chat completion and return (content, total_tokens).
+
+        OpenAI responses are streamed so the body is consumed as it is generated
+        (and long generations don't hit a single read timeout); usage arrives in
+        the final chunk. Other providers use a plain request.
+        """
+        if config.provider != "openai":
+            completion = client.chat.completions.create(**kwargs)
+            tokens = completion.usage.total_tokens if completion.usage else 0
+            return completion.choices[0].message.content, tokens
+
+        stream = client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs
+        )
+        parts = []
+        tokens = 0
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            if chunk.usage:
+                tokens = chunk.usage.total_tokens
+        return "".join(parts), tokens
+
+    @staticmethod
+    def _use_single_stage(classifier_config, analyzer_config, has_image: bool) -> bool:
+        """Single call pays off unless the analyzer is much pricier than the classifier"""
+        if analyzer_config.cost_per_1k_tokens > 4 * classifier_config.cost_per_1k_tokens:
+            return False
+        return has_image or classifier_config.provider == analyzer_config.provider
+
+    def _get_single_stage_prompt(
+        self,
+        db_prompts: Optional[Dict[str, Dict[str, str]]] = None
+    ) -> str:
+        """Classifier rubric plus each category's analysis instructions"""
+        sections = [CLASSIFY_SYSTEM_PROMPT.split("Return ONLY a JSON object")[0].rstrip()]
+        for category in _PROMPT_CATEGORIES:
+            sections.append(
+                f"ANALYSIS INSTRUCTIONS WHEN category = {category}:\n"
+                f"{self._load_prompt(category, db_prompts)['system_prompt']}"
+            )
+        sections.append(
+            "Return ONLY a JSON object with:\n"
+            "{\n"
+            '    "category": "receipt|food|workout|unknown",\n'
+            '    "confidence": 0.0-1.0,\n'
+            '    "analysis": { ...fields required by the instructions for the chosen category... }\n'
+            "}"
+        )
+        return "\n\n".join(sections)
+
+    def _process_single_stage(
+        self,
+        user_id: str,
+        description: Optional[str],
+        image_parts: Tuple[Dict[str, Any], ...],
+        config,
+        start_time: float,
+        db_prompts: Optional[Dict[str, Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """Classify and analyze in a single call with the analyzer model"""
+        logger.info(f"Starting single-stage analysis for user {user_id}")
+        client = self._get_client(config.provider)
+
+        user_prompt = (
+            f"Description: {description or ''}\n\n{self._get_time_context()}\n\n"
+            "Classify this content, then analyze it for that category. "
+            "Return ONLY valid JSON matching the expected structure."
+        )
+        messages = [
+            {"role": "system", "content": self._get_single_stage_prompt(db_prompts)},
+            {"role": "user", "content": [{"type": "text", "text": user_prompt}, *image_parts]}
+        ]
+
+        # Category payloads are free-form, so a strict json_schema can't describe them
+        completion = client.chat.completions.create(
+            model=config.model_name,
+            messages=messages,
+            **config.temperature_kwargs(),
+            **config.token_kwargs(),
+            **self._prompt_cache_kwargs(config.provider, "single-stage"),
+            response_format={"type": "json_object"}
+        )
+
+        result_text = completion.choices[0].message.content
+        total_tokens = completion.usage.total_tokens if completion.usage else 0
+        if not result_text or not result_text.strip():
+            logger.error("Single-stage analysis returned empty content")
+            return {
+                "success": False,
+                "error": "AI returned empty response — increase max_completion_tokens",
+                "category": "unknown"
+            }
+
+        result = orjson.loads(result_text)
+        category = result.get("category", "unknown")
+        confidence = result.get("confidence", 0.5)
+        total_cost = (total_tokens / 1000) * config.cost_per_1k_tokens
+        duration_ms = (time.time() - start_time) * 1000
+
+        logger.info(
+            "Single-stage analysis complete",
+            category=category,
+            total_tokens=total_tokens,
+            total_cost=total_cost,
+            duration_ms=duration_ms,
+            analysis_model=config.model_name
+        )
+
+        self._log_cost(
+            user_id=user_id,
+            category=category,
+            models_used={"classifier": config.model_name, "analyzer": config.model_name},
+            total_tokens=total_tokens,
+            cost_usd=total_cost
+        )
+
+        return {
+            "success": True,
+            "category": category,
+            "confidence": confidence,
+            "data": result.get("analysis", {}),
+            "metadata": {
+                "total_tokens": total_tokens,
+                "total_cost": total_cost,
+                "duration_ms": duration_ms,
+                "models": {
+                    "classifier": config.model_name,
+                    "analyzer": config.model_name,
+                    "provider": config.provider
+                },
+                "classification_confidence": confidence,
+                "single_stage": True
+            }
+        }
+
     def _log_cost(
         self,
         user_id: str,
@@ -556,7 +1048,7 @@ Return ONLY a JSON object with:
         total_tokens: int,
         cost_usd: float
     ):
-        """Log API usage and cost to database"""
+        """Queue API usage and cost; process_request writes the queue before returning"""
         try:
             import uuid
             log_entry = {
@@ -564,65 +1056,82 @@ Return ONLY a JSON object with:
                 "user_id": user_id,
                 "function_name": "process_request_optimized",
                 "category": category,
-                "model_used": json.dumps(models_used),
+                "model_used": models_used,
                 "total_tokens": total_tokens,
                 "cost_usd": cost_usd,
                 "created_at": utc_now()
             }
 
-            self.db.write("app_api_costs", [log_entry])
+            _COST_QUEUE.put_nowait((self.db, log_entry))
 
+        except queue.Full:
+            logger.warning(f"Cost log queue full, dropping entry for user {user_id}")
         except Exception as e:
             logger.error(f"Failed to log cost: {e}")
 
-    # get_usage_stats method removed for brevity as it's not changed in logic, 
-    # but I must include it if I replace the whole file. 
-    # Wait, the tool replaces CONTIGUOUS blocks.
-    # The file content above replaces virtually the whole class.
-    # I should include get_usage_stats so I don't delete it.
-    
+    def _aggregate_usage_sql(self, user_id: str, since: str) -> Optional[list]:
+        """Per-category usage totals computed by IbexDB (None if SQL isn't available)"""
+        if not hasattr(self.db, "execute_sql"):
+            return None
+        try:
+            result = self.db.execute_sql(
+                "SELECT category, COUNT(*) AS count, SUM(total_tokens) AS tokens, SUM(cost_usd) AS cost "
+                "FROM app_api_costs WHERE _deleted = false AND user_id = ? AND created_at >= ? GROUP BY category",
+                params=[user_id, since]
+            )
+            if result.get('success'):
+                return result.get('data', {}).get('records', [])
+        except Exception as e:
+            logger.warning(f"Usage aggregation via SQL failed, falling back to query: {e}")
+        return None
+
     def get_usage_stats(self, user_id: str, days: int = 30) -> Dict[str, Any]:
-         # (Keeping original implementation essentially)
-         try:
+        """Aggregate API usage and cost for a user over the last `days` days"""
+        try:
             # Calculate date range
-            end_date = datetime.now(pytz.utc)
+            end_date = datetime.now(timezone.utc)
             start_date = end_date - timedelta(days=days)
 
-            # Query usage logs
-            result = self.db.query(
-                "app_api_costs",
-                filters=[
-                    {"field": "user_id", "operator": "eq", "value": user_id},
-                    {"field": "created_at", "operator": "gte", "value": start_date.isoformat()}
-                ],
-                sort=[{"field": "created_at", "order": "desc"}],
-                limit=1000,
-                include_deleted=False
-            )
-
-            if not result.get('success'):
-                return {"error": "Failed to fetch usage stats"}
-
-            records = result.get('data', {}).get('records', [])
-
-            # Calculate statistics
-            total_cost = sum(r.get('cost_usd', 0) for r in records)
-            total_tokens = sum(r.get('total_tokens', 0) for r in records)
-            total_requests = len(records)
-
-            # Group by category
             by_category = {}
-            for record in records:
-                cat = record.get('category', 'unknown')
-                if cat not in by_category:
-                    by_category[cat] = {
-                        'count': 0,
-                        'tokens': 0,
-                        'cost': 0
+            rows = self._aggregate_usage_sql(user_id, start_date.strftime('%Y-%m-%dT%H:%M:%S'))
+            if rows is not None:
+                for row in rows:
+                    by_category[row.get('category') or 'unknown'] = {
+                        'count': int(row.get('count') or 0),
+                        'tokens': int(row.get('tokens') or 0),
+                        'cost': float(row.get('cost') or 0)
                     }
-                by_category[cat]['count'] += 1
-                by_category[cat]['tokens'] += record.get('total_tokens', 0)
-                by_category[cat]['cost'] += record.get('cost_usd', 0)
+            else:
+                # Query usage logs
+                result = self.db.query(
+                    "app_api_costs",
+                    filters=[
+                        {"field": "user_id", "operator": "eq", "value": user_id},
+                        {"field": "created_at", "operator": "gte", "value": start_date.isoformat()}
+                    ],
+                    sort=[{"field": "created_at", "order": "desc"}],
+                    limit=1000,
+                    include_deleted=False
+                )
+
+                if not result.get('success'):
+                    return {"error": "Failed to fetch usage stats"}
+
+                records = result.get('data', {}).get('records', [])
+
+                # Group by category in a single pass
+                grouped = defaultdict(lambda: {'count': 0, 'tokens': 0, 'cost': 0})
+                for record in records:
+                    bucket = grouped[record.get('category', 'unknown')]
+                    bucket['count'] += 1
+                    bucket['tokens'] += record.get('total_tokens', 0)
+                    bucket['cost'] += record.get('cost_usd', 0)
+                by_category = dict(grouped)
+
+            # Grand totals from the (small) per-category groups
+            total_cost = sum(c['cost'] for c in by_category.values())
+            total_tokens = sum(c['tokens'] for c in by_category.values())
+            total_requests = sum(c['count'] for c in by_category.values())
 
             return {
                 "period_days": days,
@@ -631,23 +1140,17 @@ Return ONLY a JSON object with:
                 "total_cost_usd": round(total_cost, 4),
                 "average_cost_per_request": round(total_cost / total_requests, 4) if total_requests > 0 else 0,
                 "by_category": by_category,
-                "optimization_savings": self._calculate_savings(records)
+                "optimization_savings": self._calculate_savings(total_cost, total_tokens)
             }
 
-         except Exception as e:
+        except Exception as e:
             logger.error(f"Failed to get usage stats: {e}")
             return {"error": str(e)}
 
-    def _calculate_savings(self, records: list) -> Dict[str, float]:
+    def _calculate_savings(self, optimized_cost: float, total_tokens: int) -> Dict[str, float]:
         """Calculate cost savings from optimization"""
-        optimized_cost = sum(r.get('cost_usd', 0) for r in records)
-
         # Calculate what it would cost with only gpt-4o
-        hypothetical_cost = 0
-        for record in records:
-            tokens = record.get('total_tokens', 0)
-            # Assume gpt-4o for everything
-            hypothetical_cost += (tokens / 1000) * 0.0125  # Average of input/output
+        hypothetical_cost = (total_tokens / 1000) * 0.0125  # Average of input/output
 
         savings = hypothetical_cost - optimized_cost
         savings_percent = (savings / hypothetical_cost * 100) if hypothetical_cost > 0 else 0
@@ -4,16 +4,21 @@ Supports Google, Auth0, Okta, Azure AD, and other OIDC providers
 """
 
 import os
-import json
-import time
-import jwt
-import requests
+import orjson
 from typing import Dict, Any, Optional, Tuple
-from functools import lru_cache
+from urllib.parse import quote, urlencode
 from dataclasses import dataclass
 
+from lib._rs256 import HTTP_POOL, RS256Verifier
 from lib.logger import logger
 
+# Claims OIDC Core mandates in every ID token
+_REQUIRED_CLAIMS = ("exp", "iat", "aud", "iss", "sub")
+
+# Resolved configuration (env + discovery) and shared instances, per provider name
+_CONFIG_CACHE: Dict[str, "OIDCConfig"] = {}
+_PROVIDER_INSTANCES: Dict[str, "OIDCProvider"] = {}
+
 
 @dataclass
 class OIDCConfig:
@@ -68,10 +73,11 @@ class OIDCProvider:
     def __init__(self, provider: str = "custom"):
         """Initialize OIDC provider"""
         self.provider_name = provider
-        self.config = self._load_config(provider)
-        self._jwks_cache = {}
-        self._jwks_cache_time = 0
-        self._jwks_cache_ttl = 3600  # 1 hour
+        config = _CONFIG_CACHE.get(provider)
+        if config is None:
+            config = _CONFIG_CACHE.setdefault(provider, self._load_config(provider))
+        self.config = config
+        self._verifier: Optional[RS256Verifier] = None  # built on first verify
 
     def _load_config(self, provider: str) -> OIDCConfig:
         """Load provider configuration"""
@@ -89,20 +95,22 @@ class OIDCProvider:
             scopes=os.environ.get("OIDC_SCOPES", "openid profile email")
         )
 
-        # Auto-discover endpoints if not provided
-        if config.issuer and not config.jwks_uri:
-            config = self._discover_endpoints(config)
-
+        # Endpoints missing here are discovered lazily (see _ensure_endpoints)
         return config
 
+    def _ensure_endpoints(self):
+        """Auto-discover OIDC endpoints on first use if they weren't configured"""
+        if self.config.issuer and not self.config.jwks_uri:
+            self._discover_endpoints(self.config)
+
     def _discover_endpoints(self, config: OIDCConfig) -> OIDCConfig:
         """Auto-discover OIDC endpoints from .well-known"""
         try:
             discovery_url = f"{config.issuer}/.well-known/openid-configuration"
-            response = requests.get(discovery_url, timeout=5)
+            response = HTTP_POOL.request("GET", discovery_url, timeout=5.0)
 
-            if response.status_code == 200:
-                data = response.json()
+            if response.status == 200:
+                data = orjson.loads(response.data)
                 config.jwks_uri = data.get("jwks_uri", config.jwks_uri)
                 config.authorization_endpoint = data.get("authorization_endpoint", config.authorization_endpoint)
                 config.token_endpoint = data.get("token_endpoint", config.token_endpoint)
@@ -113,93 +121,41 @@ class OIDCProvider:
 
         return config
 
-    @lru_cache(maxsize=100)
-    def _get_jwks(self) -> Dict[str, Any]:
-        """Get JWKS (JSON Web Key Set) from provider"""
-        current_time = time.time()
-
-        # Check cache
-        if self._jwks_cache and (current_time - self._jwks_cache_time) < self._jwks_cache_ttl:
-            return self._jwks_cache
-
-        try:
-            response = requests.get(self.config.jwks_uri, timeout=5)
-            if response.status_code == 200:
-                self._jwks_cache = response.json()
-                self._jwks_cache_time = current_time
-                return self._jwks_cache
-        except Exception as e:
-            logger.error(f"Failed to fetch JWKS: {e}")
-
-        return {}
-
     def verify_token(self, token: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
         """
         Verify OIDC ID token
         Returns: (is_valid, claims)
         """
-        try:
-            # Decode header to get key ID
-            unverified_header = jwt.get_unverified_header(token)
-            kid = unverified_header.get("kid")
-
-            # Get JWKS
-            jwks = self._get_jwks()
-
-            # Find the key
-            rsa_key = {}
-            for key in jwks.get("keys", []):
-                if key.get("kid") == kid:
-                    rsa_key = {
-                        "kty": key["kty"],
-                        "kid": key["kid"],
-                        "use": key["use"],
-                        "n": key["n"],
-                        "e": key["e"]
-                    }
-                    break
-
-            if not rsa_key:
-                logger.error(f"Unable to find a signing key that matches: {kid}")
-                return False, None
-
-            # Verify token
-            claims = jwt.decode(
-                token,
-                key=jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(rsa_key)),
-                algorithms=["RS256"],
+        if self._verifier is None:
+            self._ensure_endpoints()
+            if not self.config.jwks_uri:
+                logger.error(f"No JWKS endpoint configured or discovered for {self.provider_name}")
+                return False, {"error": "JWKS endpoint unavailable"}
+            self._verifier = RS256Verifier(
+                self.config.jwks_uri,
                 audience=self.config.client_id,
                 issuer=self.config.issuer,
-                options={"verify_exp": True}
+                require=_REQUIRED_CLAIMS
             )
-
-            return True, claims
-
-        except jwt.ExpiredSignatureError:
-            logger.error("Token has expired")
-            return False, {"error": "Token expired"}
-        except jwt.InvalidTokenError as e:
-            logger.error(f"Invalid token: {e}")
-            return False, {"error": str(e)}
-        except Exception as e:
-            logger.error(f"Token verification failed: {e}")
-            return False, {"error": str(e)}
+        return self._verifier.verify(token)
 
     def get_user_info(self, access_token: str) -> Optional[Dict[str, Any]]:
         """Get user information from OIDC provider"""
+        self._ensure_endpoints()
         if not self.config.userinfo_endpoint:
             return None
 
         try:
             headers = {"Authorization": f"Bearer {access_token}"}
-            response = requests.get(
+            response = HTTP_POOL.request(
+                "GET",
                 self.config.userinfo_endpoint,
                 headers=headers,
-                timeout=5
+                timeout=5.0
             )
 
-            if response.status_code == 200:
-                return response.json()
+            if response.status == 200:
+                return orjson.loads(response.data)
 
         except Exception as e:
             logger.error(f"Failed to get user info: {e}")
@@ -208,6 +164,7 @@ class OIDCProvider:
 
     def build_authorization_url(self, redirect_uri: str, state: Optional[str] = None) -> str:
         """Build authorization URL for OIDC flow"""
+        self._ensure_endpoints()
         params = {
             "client_id": self.config.client_id,
             "response_type": "code",
@@ -218,11 +175,11 @@ class OIDCProvider:
         if state:
             params["state"] = state
 
-        query_string = "&".join([f"{k}={v}" for k, v in params.items()])
-        return f"{self.config.authorization_endpoint}?{query_string}"
+        return f"{self.config.authorization_endpoint}?{urlencode(params, quote_via=quote)}"
 
     def exchange_code_for_token(self, code: str, redirect_uri: str) -> Optional[Dict[str, Any]]:
         """Exchange authorization code for tokens"""
+        self._ensure_endpoints()
         if not self.config.token_endpoint:
             return None
 
@@ -237,14 +194,16 @@ class OIDCProvider:
             if self.config.client_secret:
                 data["client_secret"] = self.config.client_secret
 
-            response = requests.post(
+            response = HTTP_POOL.request(
+                "POST",
                 self.config.token_endpoint,
-                data=data,
-                timeout=10
+                fields=data,
+                encode_multipart=False,
+                timeout=10.0
             )
 
-            if response.status_code == 200:
-                return response.json()
+            if response.status == 200:
+                return orjson.loads(response.data)
 
         except Exception as e:
             logger.error(f"Failed to exchange code for token: {e}")
@@ -252,6 +211,14 @@ class OIDCProvider:
         return None
 
 
+def get_oidc_provider(provider: str = "custom") -> OIDCProvider:
+    """Return the process-wide OIDCProvider for a provider name"""
+    oidc = _PROVIDER_INSTANCES.get(provider)
+    if oidc is None:
+        oidc = _PROVIDER_INSTANCES.setdefault(provider, OIDCProvider(provider))
+    return oidc
+
+
 def verify_oidc_token(event: Dict[str, Any]) -> Tuple[bool, Optional[str], Optional[Dict[str, Any]]]:
     """
     Verify OIDC token from Lambda event
@@ -271,8 +238,8 @@ def verify_oidc_token(event: Dict[str, Any]) -> Tuple[bool, Optional[str], Optio
     # Determine provider from environment or token
     provider = os.environ.get("OIDC_PROVIDER", "custom")
 
-    # Initialize OIDC provider
-    oidc = OIDCProvider(provider)
+    # Shared OIDC provider for this warm container
+    oidc = get_oidc_provider(provider)
 
     # Verify token
     is_valid, claims = oidc.verify_token(token)
@@ -287,5 +254,4 @@ def verify_oidc_token(event: Dict[str, Any]) -> Tuple[bool, Optional[str], Optio
 
 def get_oidc_user_info(access_token: str, provider: str = "custom") -> Optional[Dict[str, Any]]:
     """Get user information from OIDC provider using access token"""
-    oidc = OIDCProvider(provider)
-    return oidc.get_user_info(access_token)
\ No newline at end of file
+    return get_oidc_provider(provider).get_user_info(access_token)
\ No newline at end of file
@@ -23,6 +23,24 @@ from ajna_cloud.auth import (
 )
 from ajna_cloud import logger
 
+# Configured provider, resolved on first use and reused for the container's lifetime
+_PROVIDER: Optional[AuthProvider] = None
+
+
+def _get_provider() -> AuthProvider:
+    """Return the configured auth provider, resolving it via AuthFactory once."""
+    global _PROVIDER
+    if _PROVIDER is None:
+        _PROVIDER = AuthFactory.get_provider()
+    return _PROVIDER
+
+
+def reset_provider():
+    """Reset AuthFactory and drop the cached provider (e.g. after AUTH_MODE changes)."""
+    global _PROVIDER
+    AuthFactory.reset()
+    _PROVIDER = None
+
 
 def _inject_claims_into_event(event: Dict[str, Any], user_info: Dict[str, Any]):
     """Inject authenticated user claims into event so get_user_id(event) works.
@@ -51,7 +69,7 @@ def require_auth(func):
     and syncs user to database on every authenticated request."""
     @wraps(func)
     def wrapper(event: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
-        provider = AuthFactory.get_provider()
+        provider = _get_provider()
         try:
             from ajna_cloud.http import respond
         except ImportError:
@@ -62,7 +80,8 @@ def require_auth(func):
             context['auth'] = user_info
             _inject_claims_into_event(event, user_info)
 
-            # Auto-sync user to database (creates on first visit, updates last_usage_date)
+            # Auto-sync user to database (creates on first visit; existing users are
+            # checked at most once a day and never updated per request)
             db = context.get('db')
             if db and user_info.get('user_id'):
                 try:
@@ -104,12 +123,13 @@ __all__ = [
     'require_admin',
     'require_scopes',
     'get_user_id',
+    'reset_provider',
 ]
 
 
 def verify_token(token: str):
     """Verify token using configured auth provider (convenience wrapper)."""
-    provider = AuthFactory.get_provider()
+    provider = _get_provider()
     if hasattr(provider, 'authenticate'):
         event = {'headers': {'Authorization': f'Bearer {token}'}}
         try:
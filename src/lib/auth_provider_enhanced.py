@@ -9,10 +9,20 @@ from typing import Optional, Dict, Any
 from functools import wraps
 from datetime import datetime
 
-from lib.auth_sync import ensure_user_exists, get_user_role, is_admin
+from lib._rs256 import RS256Verifier
+from lib.auth_sync import ensure_user_exists, get_user_role, invalidate_user_role, is_admin
 
 logger = logging.getLogger(__name__)
 
+# Set on requestContext.authorizer once an event has been verified, so stacked
+# decorators (e.g. require_auth + require_admin) don't verify and sync twice
+_VERIFIED_USER_KEY = '_verified_user'
+
+
+def invalidate_role(user_id: str, db):
+    """Drop the cached role for user_id in db's tenant (call after a role change)"""
+    invalidate_user_role(user_id, db)
+
 class EnhancedCognitoAuthProvider:
     """Cognito auth provider with automatic user sync and role checking"""
 
@@ -24,59 +34,83 @@ class EnhancedCognitoAuthProvider:
         if not self.user_pool_id or not self.client_id:
             raise ValueError("Cognito configuration missing")
 
+        # Shared RS256 verification (JWKS, parsed keys and verified tokens are cached)
+        jwks_url = f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}/.well-known/jwks.json"
+        self._verifier = RS256Verifier(jwks_url, audience=self.client_id, leeway=60)
+
         logger.info(f"Enhanced Cognito Auth initialized for pool {self.user_pool_id}")
 
-    def verify_token_and_sync(self, token: str, db) -> Optional[Dict[str, Any]]:
+    def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
         """
-        Verify Cognito JWT token and sync user to database
+        Verify a Cognito JWT token (signature, audience, expiry)
 
         Args:
             token: JWT token from Cognito
+
+        Returns:
+            Decoded claims, or None if the token is invalid
+        """
+        is_valid, claims = self._verifier.verify(token)
+        return claims if is_valid else None
+
+    def sync_user(self, decoded: Dict[str, Any], db) -> Optional[Dict[str, Any]]:
+        """
+        Sync a verified user to the database and resolve their role
+
+        Args:
+            decoded: Verified token claims
             db: IbexClient instance
 
         Returns:
             User info dict with role from database
         """
+        user_id = decoded.get('sub')
+        if not user_id:
+            return None
+
         try:
-            import jwt
-            from jwt import PyJWKClient
-
-            # Get public keys from Cognito
-            jwks_url = f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}/.well-known/jwks.json"
-            jwks_client = PyJWKClient(jwks_url)
-
-            # Decode and verify token
-            signing_key = jwks_client.get_signing_key_from_jwt(token)
-            decoded = jwt.decode(
-                token,
-                signing_key.key,
-                algorithms=["RS256"],
-                audience=self.client_id,
-                leeway=60,
-                options={"verify_exp": True}
-            )
-
-            user_id = decoded.get('sub')
-            if not user_id:
-                return None
-
-            # Ensure user exists in database
+            # Ensure user exists in database (a no-op for recently synced users)
             ensure_user_exists(user_id, decoded, db)
 
-            # Get user role from database (not from token)
+            # Get user role from database, not from token (cached per tenant)
             role = get_user_role(user_id, db) or 'participant'
+        except Exception as e:
+            logger.error(f"User sync failed: {e}")
+            return None
 
-            return {
-                "id": user_id,
-                "email": decoded.get('email'),
-                "name": decoded.get('name'),
-                "role": role,  # Role from database, not token
-                "tenant_id": decoded.get('custom:tenant_id', 'default')
-            }
+        return {
+            "id": user_id,
+            "email": decoded.get('email'),
+            "name": decoded.get('name'),
+            "role": role,  # Role from database, not token
+            "tenant_id": decoded.get('custom:tenant_id', 'default')
+        }
 
-        except Exception as e:
-            logger.error(f"Token verification failed: {e}")
+    def verify_token_and_sync(self, token: str, db) -> Optional[Dict[str, Any]]:
+        """
+        Verify Cognito JWT token and sync user to database
+
+        Args:
+            token: JWT token from Cognito
+            db: IbexClient instance
+
+        Returns:
+            User info dict with role from database
+        """
+        decoded = self.verify_token(token)
+        if not decoded:
             return None
+        return self.sync_user(decoded, db)
+
+    def _refresh_role(self, user: Dict[str, Any], db) -> Optional[str]:
+        """Re-read user's role from the database (bypassing the role cache) and update user
+
+        Returns None when the role could not be read.
+        """
+        role = get_user_role(user['id'], db, use_cache=False)
+        if role:
+            user['role'] = role
+        return role
 
     def get_user_from_event(self, event: Dict[str, Any], db) -> Optional[Dict[str, Any]]:
         """
@@ -89,6 +123,11 @@ class EnhancedCognitoAuthProvider:
         Returns:
             User info with role from database
         """
+        # An outer auth decorator already verified and synced this event
+        verified = (event.get('requestContext') or {}).get('authorizer', {}).get(_VERIFIED_USER_KEY)
+        if verified:
+            return verified
+
         headers = event.get('headers', {})
         auth_header = headers.get('Authorization') or headers.get('authorization') or ''
 
@@ -122,7 +161,8 @@ class EnhancedCognitoAuthProvider:
             event['requestContext'] = event.get('requestContext', {})
             event['requestContext']['authorizer'] = {
                 'userId': user['id'],
-                'claims': user
+                'claims': user,
+                _VERIFIED_USER_KEY: user
             }
 
             return func(event, context)
@@ -148,8 +188,10 @@ class EnhancedCognitoAuthProvider:
                     "body": json.dumps({"error": "Unauthorized"})
                 }
 
-            # Check if user is admin
-            if user.get('role') != 'admin':
+            # Check if user is admin against the database, never the cached role:
+            # a promotion or demotion made in another container must take effect
+            # here immediately (fails closed if the role can't be read)
+            if self._refresh_role(user, db) != 'admin':
                 return {
                     "statusCode": 403,
                     "headers": {"Access-Control-Allow-Origin": "*"},
@@ -160,7 +202,8 @@ class EnhancedCognitoAuthProvider:
             event['requestContext'] = event.get('requestContext', {})
             event['requestContext']['authorizer'] = {
                 'userId': user['id'],
-                'claims': user
+                'claims': user,
+                _VERIFIED_USER_KEY: user
             }
 
             return func(event, context)
@@ -5,15 +5,58 @@ Handles automatic sync between Cognito and database
 
 import os
 import time
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Set, Tuple
 from utils.timestamps import utc_now
+from lib._rs256 import RS256Verifier
 
 logger = logging.getLogger(__name__)
 
-# In-memory cache: user_id -> last_sync_epoch (survives across warm Lambda invocations)
-_user_sync_cache: Dict[str, float] = {}
+# In-memory cache: (tenant_id, namespace, user_id) -> last_sync_epoch (survives
+# across warm Lambda invocations). Each tenant has its own app_users_v4
+_user_sync_cache: Dict[Tuple[str, str, str], float] = {}
 _SYNC_INTERVAL = 86400  # Only update user record once per 24 hours
+_USER_SYNC_MAX = 20000
+
+# (tenant_id, namespace) pairs whose app_users_v4 is known to be non-empty;
+# the bootstrap-admin check is never needed again for those tenants
+_FIRST_USER_CHECK_DONE: Set[Tuple[str, str]] = set()
+
+# Runs the bootstrap-admin query alongside the existence check
+_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="auth-sync")
+
+# Recently verified tokens: (tenant_id, namespace, sha256(token)[:32]) ->
+# (expires_at epoch, user_id). Only successful verifications are stored; the
+# tenant is part of the key because a hit also skips that tenant's user sync
+_verified_token_cache: Dict[Tuple[str, str, str], Tuple[float, str]] = {}
+_verified_token_lock = threading.Lock()
+_VERIFIED_TOKEN_TTL = 30  # seconds, never beyond the token's own exp
+_VERIFIED_TOKEN_MAX = 10000
+
+# Roles read from the database: (tenant_id, namespace, user_id) -> (expires_at
+# epoch, role). The only role cache; changes made through invalidate_user_role
+# are seen immediately in this container only, so admin checks bypass it
+_user_role_cache: Dict[Tuple[str, str, str], Tuple[float, str]] = {}
+_user_role_lock = threading.Lock()
+_USER_ROLE_TTL = 120  # seconds
+_USER_ROLE_MAX = 10000
+
+# One verifier per (region, user_pool_id, client_id)
+_verifiers: Dict[tuple, RS256Verifier] = {}
+
+
+def _mark_synced(sync_key: Tuple[str, str, str], now: float):
+    """Record a successful sync, keeping the cache bounded in long-lived containers"""
+    if len(_user_sync_cache) >= _USER_SYNC_MAX:
+        # Drop expired entries first; if everything is fresh, start over
+        for key in [k for k, t in _user_sync_cache.items() if (now - t) >= _SYNC_INTERVAL]:
+            _user_sync_cache.pop(key, None)
+        if len(_user_sync_cache) >= _USER_SYNC_MAX:
+            _user_sync_cache.clear()
+    _user_sync_cache[sync_key] = now
 
 
 def ensure_user_exists(user_id: str, user_claims: Dict[str, Any], db) -> bool:
@@ -32,17 +75,26 @@ def ensure_user_exists(user_id: str, user_claims: Dict[str, Any], db) -> bool:
     """
     # Skip update if we synced this user recently
     now = time.time()
-    last_sync = _user_sync_cache.get(user_id, 0)
+    tenant_slot = (db.tenant_id, db.namespace)
+    sync_key = (*tenant_slot, user_id)
+    last_sync = _user_sync_cache.get(sync_key, 0)
     if (now - last_sync) < _SYNC_INTERVAL:
         return True
 
     try:
-        # Check if user already exists
+        # While the table might still be empty, start the first-user query now
+        # so a create doesn't pay for it after the existence check
+        first_user_query = None
+        if tenant_slot not in _FIRST_USER_CHECK_DONE:
+            first_user_query = _EXECUTOR.submit(db.query, "app_users_v4", limit=1, include_deleted=False)
+
+        # Check if user already exists (existence never reverts, so the
+        # client's query cache is safe here)
         result = db.query(
             "app_users_v4",
             filters=[{"field": "id", "operator": "eq", "value": user_id}],
             limit=1,
-            use_cache=False,
+            use_cache=True,
             include_deleted=False
         )
 
@@ -51,10 +103,11 @@ def ensure_user_exists(user_id: str, user_claims: Dict[str, Any], db) -> bool:
             records = data.get('records', [])
 
             if records:
+                _FIRST_USER_CHECK_DONE.add(tenant_slot)
                 # User exists — mark as synced, skip the UPDATE
                 # (The UPDATE on app_users_v4 was causing persistent errors
                 #  due to Iceberg schema mismatches on this table)
-                _user_sync_cache[user_id] = now
+                _mark_synced(sync_key, now)
                 return True
 
         # User doesn't exist, create new user
@@ -64,21 +117,25 @@ def ensure_user_exists(user_id: str, user_claims: Dict[str, Any], db) -> bool:
         # Check for custom attributes (Cognito custom attributes are prefixed with 'custom:')
         role = user_claims.get('custom:role', 'participant')
         # For first user in system, make them admin
-        # Check if this is the first user
-        all_users_result = db.query("app_users_v4", limit=1, include_deleted=False)
-        if all_users_result and all_users_result.get('success'):
-            existing_users = all_users_result.get('data', {}).get('records', [])
-            if len(existing_users) == 0:
-                logger.info(f"First user in system, granting admin role to {email}")
-                role = 'admin'
-
+        # Check if this is the first user (at most until a user is seen)
+        if first_user_query is not None and tenant_slot not in _FIRST_USER_CHECK_DONE:
+            all_users_result = first_user_query.result()
+            if all_users_result and all_users_result.get('success'):
+                existing_users = all_users_result.get('data', {}).get('records', [])
+                if len(existing_users) == 0:
+                    logger.info(f"First user in system, granting admin role to {email}")
+                    role = 'admin'
+                else:
+                    _FIRST_USER_CHECK_DONE.add(tenant_slot)
+
+        now_iso = utc_now()
         user_data = {
             "id": user_id,
             "email": email,
             "name": full_name,
             "role": role,
-            "created_at": utc_now(),
-            "updated_at": utc_now()
+            "created_at": now_iso,
+            "updated_at": now_iso
         }
 
         logger.info(f"Creating new user: {email} with role: {role}")
@@ -87,7 +144,8 @@ def ensure_user_exists(user_id: str, user_claims: Dict[str, Any], db) -> bool:
 
         if write_result and write_result.get('success'):
             logger.info(f"Successfully created user {user_id} ({email})")
-            _user_sync_cache[user_id] = now
+            _FIRST_USER_CHECK_DONE.add(tenant_slot)
+            _mark_synced(sync_key, now)
             return True
         else:
             logger.error(f"Failed to create user {user_id}: {write_result}")
@@ -98,6 +156,15 @@ def ensure_user_exists(user_id: str, user_claims: Dict[str, Any], db) -> bool:
         # Don't fail the request if sync fails
         return False
 
+def _get_verifier(region: str, user_pool_id: str, client_id: str) -> RS256Verifier:
+    """Return the shared verifier for a Cognito pool (JWKS and parsed keys are reused)"""
+    key = (region, user_pool_id, client_id)
+    verifier = _verifiers.get(key)
+    if verifier is None:
+        jwks_url = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}/.well-known/jwks.json"
+        verifier = _verifiers.setdefault(key, RS256Verifier(jwks_url, audience=client_id, leeway=60))
+    return verifier
+
 def sync_user_from_token(token: str, db) -> Optional[str]:
     """
     Sync user from Cognito token to database
@@ -109,10 +176,13 @@ def sync_user_from_token(token: str, db) -> Optional[str]:
     Returns:
         str: User ID if successful, None otherwise
     """
-    try:
-        import jwt
-        from jwt import PyJWKClient
+    token_key = (db.tenant_id, db.namespace, hashlib.sha256(token.encode()).hexdigest()[:32])
+    cached = _verified_token_cache.get(token_key)
+    if cached and time.time() < cached[0]:
+        # Verified (and synced) moments ago: skip the crypto and the DB check
+        return cached[1]
 
+    try:
         # Get Cognito configuration
         region = os.environ.get('COGNITO_REGION', 'ap-south-1')
         user_pool_id = os.environ.get('COGNITO_USER_POOL_ID')
@@ -123,44 +193,54 @@ def sync_user_from_token(token: str, db) -> Optional[str]:
             return None
 
         # Verify and decode token
-        jwks_url = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}/.well-known/jwks.json"
-        jwks_client = PyJWKClient(jwks_url)
-
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
-        decoded = jwt.decode(
-            token,
-            signing_key.key,
-            algorithms=["RS256"],
-            audience=client_id,
-            leeway=60,
-            options={"verify_exp": True}
-        )
+        is_valid, decoded = _get_verifier(region, user_pool_id, client_id).verify(token)
+        if not is_valid:
+            logger.warning(f"Token verification failed, skipping sync: {(decoded or {}).get('error')}")
+            return None
 
         user_id = decoded.get('sub')
         if user_id:
             # Ensure user exists in database
             ensure_user_exists(user_id, decoded, db)
+
+            now = time.time()
+            expires_at = min(now + _VERIFIED_TOKEN_TTL, float(decoded.get('exp', now)))
+            with _verified_token_lock:
+                if len(_verified_token_cache) >= _VERIFIED_TOKEN_MAX:
+                    _verified_token_cache.clear()
+                _verified_token_cache[token_key] = (expires_at, user_id)
             return user_id
 
-    except jwt.ExpiredSignatureError:
-        logger.warning("Token expired, skipping sync")
     except Exception as e:
         logger.error(f"Error syncing user from token: {e}")
 
     return None
 
-def get_user_role(user_id: str, db) -> Optional[str]:
+def invalidate_user_role(user_id: str, db):
+    """Forget the cached role for user_id in db's tenant (call after changing it)"""
+    with _user_role_lock:
+        _user_role_cache.pop((db.tenant_id, db.namespace, user_id), None)
+
+def get_user_role(user_id: str, db, use_cache: bool = True) -> Optional[str]:
     """
-    Get user role from database
+    Get user role from database (cached for _USER_ROLE_TTL seconds)
 
     Args:
         user_id: User ID
         db: IbexClient instance
+        use_cache: False always reads the database (the result is still cached)
 
     Returns:
         str: User role or None if not found
     """
+    cache_key = (db.tenant_id, db.namespace, user_id)
+    cached = _user_role_cache.get(cache_key) if use_cache else None
+    if cached and time.time() < cached[0]:
+        return cached[1]
+
     try:
+        # Bypass the client cache: _user_role_cache already absorbs repeat
+        # reads and is invalidated on role changes, which the client cache is not
         result = db.query(
             "app_users_v4",
             filters=[{"field": "id", "operator": "eq", "value": user_id}],
@@ -173,7 +253,12 @@ def get_user_role(user_id: str, db) -> Optional[str]:
             data = result.get('data', {})
             records = data.get('records', [])
             if records:
-                return records[0].get('role', 'participant')
+                role = records[0].get('role', 'participant')
+                with _user_role_lock:
+                    if len(_user_role_cache) >= _USER_ROLE_MAX:
+                        _user_role_cache.clear()
+                    _user_role_cache[cache_key] = (time.time() + _USER_ROLE_TTL, role)
+                return role
 
     except Exception as e:
         logger.error(f"Error getting user role: {e}")
@@ -182,7 +267,8 @@ def get_user_role(user_id: str, db) -> Optional[str]:
 
 def is_admin(user_id: str, db) -> bool:
     """
-    Check if user has admin role
+    Check if user has admin role (always read from the database, so a
+    demotion made in another container takes effect immediately)
 
     Args:
         user_id: User ID
@@ -191,5 +277,5 @@ def is_admin(user_id: str, db) -> bool:
     Returns:
         bool: True if user is admin
     """
-    role = get_user_role(user_id, db)
+    role = get_user_role(user_id, db, use_cache=False)
     return role == 'admin'
\ No newline at end of file
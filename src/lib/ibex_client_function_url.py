@@ -3,20 +3,23 @@ IbexClient optimized for Lambda Function URLs
 Simpler and faster than API Gateway
 """
 
+import os
 import json
+import logging
+import orjson
 import requests
 import hashlib
-import time
-from typing import Dict, Any, Optional, List
-from collections import OrderedDict
-import threading
-from datetime import datetime
-import boto3
-from botocore.auth import SigV4Auth
-from botocore.awsrequest import AWSRequest
+from typing import Dict, Any
 
 # Import base optimized client
-from .ibex_client_optimized import OptimizedIbexClient, GLOBAL_CACHE, CACHE_STATS
+from .ibex_client_optimized import OptimizedIbexClient, HTTP_SESSION
+
+logger = logging.getLogger(__name__)
+
+_CACHEABLE_OPERATIONS = frozenset({"QUERY", "LIST_TABLES", "DESCRIBE_TABLE"})
+
+# CACHE_ENABLED=false turns the read cache off (no cache-key work at all)
+_CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
 
 class FunctionURLIbexClient(OptimizedIbexClient):
     """
@@ -50,14 +53,25 @@ class FunctionURLIbexClient(OptimizedIbexClient):
         self.tenant_id = tenant_id
         self.namespace = namespace
 
-        # Session for connection pooling
-        self.session = requests.Session()
+        # Shared pooled session (connections survive across client instances)
+        self.session = HTTP_SESSION
 
         # If using IAM auth, we need boto3 session for signing
+        # (boto3/botocore are imported only here: they are slow to load and
+        # unused on the unsigned path)
         if use_iam_auth:
+            import boto3
+            from botocore.auth import SigV4Auth
             self.boto_session = boto3.Session()
             self.credentials = self.boto_session.get_credentials()
             self.region = self.boto_session.region_name or 'us-east-1'
+            # One signer per client; refreshable credentials are re-read on use
+            self._sigv4 = SigV4Auth(self.credentials, "lambda", self.region)
+
+        self.request_headers = {
+            'Content-Type': 'application/json',
+            'X-Tenant-Id': tenant_id  # Custom header for tenant
+        }
 
         # Base payload
         self.base_payload = {
@@ -78,6 +92,8 @@ class FunctionURLIbexClient(OptimizedIbexClient):
         if not self.use_iam_auth:
             return request
 
+        from botocore.awsrequest import AWSRequest
+
         # Create AWS request for signing
         aws_request = AWSRequest(
             method=request.method,
@@ -87,7 +103,7 @@ class FunctionURLIbexClient(OptimizedIbexClient):
         )
 
         # Sign with SigV4
-        SigV4Auth(self.credentials, "lambda", self.region).add_auth(aws_request)
+        self._sigv4.add_auth(aws_request)
 
         # Update original request with signed headers
         request.headers.update(dict(aws_request.headers))
@@ -98,32 +114,32 @@ class FunctionURLIbexClient(OptimizedIbexClient):
         Call Lambda Function URL directly
         15-20% faster than API Gateway
         """
-        full_payload = {**self.base_payload, **payload}
-
-        # Prepare request
-        request = requests.Request(
-            method='POST',
-            url=self.function_url,
-            json=full_payload,
-            headers={
-                'Content-Type': 'application/json',
-                'X-Tenant-Id': self.tenant_id  # Custom header for tenant
-            }
-        )
-
-        prepared = self.session.prepare_request(request)
-
-        # Sign if using IAM auth
-        if self.use_iam_auth:
-            prepared = self._sign_request(prepared)
+        body = orjson.dumps(payload)
 
         # Execute request
         try:
-            response = self.session.send(prepared, timeout=timeout)
+            if self.use_iam_auth:
+                # SigV4 signs the final headers and body, so go through a prepared request
+                request = requests.Request(
+                    method='POST',
+                    url=self.function_url,
+                    data=body,
+                    headers=self.request_headers
+                )
+                prepared = self._sign_request(self.session.prepare_request(request))
+                response = self.session.send(prepared, timeout=timeout)
+            else:
+                response = self.session.post(
+                    self.function_url, data=body, headers=self.request_headers, timeout=timeout
+                )
             response.raise_for_status()
 
-            # Parse response
-            result = response.json()
+            # Parse response (orjson rejects bare NaN, which Ibex can emit for
+            # empty numeric cells; the stdlib parser accepts it)
+            try:
+                result = orjson.loads(response.content)
+            except orjson.JSONDecodeError:
+                result = json.loads(response.content)
 
             # Function URLs return the Lambda response directly
             # No need to parse 'body' field like with API Gateway
@@ -146,12 +162,16 @@ class FunctionURLIbexClient(OptimizedIbexClient):
         """
         self.stats["total_requests"] += 1
 
+        # Work on a copy with tenant/namespace filled in (explicit values in
+        # payload still win), so the cache key is computed from exactly the
+        # request that is sent and the caller's dict is left untouched
+        payload = {"tenant_id": self.tenant_id, "namespace": self.namespace, **payload}
+
         # Check cache for read operations
         operation = payload.get("operation", "")
-        if use_cache and operation in ["QUERY", "LIST_TABLES", "DESCRIBE_TABLE"]:
-            # Remove 'operation' from payload before passing to _get_cache_key
-            payload_without_op = {k: v for k, v in payload.items() if k != "operation"}
-            cache_key = self._get_cache_key(operation, **payload_without_op)
+        cache_key = None
+        if use_cache and _CACHE_ENABLED and operation in _CACHEABLE_OPERATIONS:
+            cache_key = self._payload_cache_key(operation, payload)
             cached_result = self._get_from_cache(cache_key)
 
             if cached_result is not None:
@@ -167,16 +187,23 @@ class FunctionURLIbexClient(OptimizedIbexClient):
             result = self._call_api(payload, timeout)  # Falls back to parent class method
 
         # Cache successful read operations
-        if use_cache and operation in ["QUERY", "LIST_TABLES", "DESCRIBE_TABLE"]:
-            if result.get("success"):
-                # Remove 'operation' from payload before passing to _get_cache_key
-                payload_without_op = {k: v for k, v in payload.items() if k != "operation"}
-                cache_key = self._get_cache_key(operation, **payload_without_op)
-                ttl = 60 if operation == "QUERY" else 300
-                self._put_in_cache(cache_key, result, ttl)
+        if cache_key is not None and result.get("success"):
+            ttl = 60 if operation == "QUERY" else 300
+            self._put_in_cache(cache_key, result, ttl)
 
         return result
 
+    def _payload_cache_key(self, operation: str, payload: Dict[str, Any]) -> str:
+        """Short stable cache key: tenant, namespace, operation and table stay readable, the rest is hashed
+
+        The cache is process-wide, so the key must never match another tenant's request.
+        """
+        digest = hashlib.blake2b(
+            orjson.dumps({k: v for k, v in payload.items() if k != "operation"}, option=orjson.OPT_SORT_KEYS),
+            digest_size=16
+        ).hexdigest()
+        return f"{self.tenant_id}:{self.namespace}:{operation}:{payload.get('table', '')}:{digest}"
+
     def get_stats(self) -> Dict:
         """Get performance statistics including Function URL metrics"""
         base_stats = super().get_stats()
@@ -207,21 +234,19 @@ def create_ibex_client(prefer_function_url: bool = True, **kwargs) -> OptimizedI
         IBEX_USE_IAM_AUTH: Whether to use IAM authentication
         IBEX_API_URL: API Gateway URL (fallback)
     """
-    import os
-
     function_url = os.environ.get('IBEX_FUNCTION_URL')
     api_url = os.environ.get('IBEX_API_URL')
     use_iam_auth = os.environ.get('IBEX_USE_IAM_AUTH', 'false').lower() == 'true'
 
     if prefer_function_url and function_url:
-        print(f"Using Lambda Function URL: {function_url}")
+        logger.debug("Using Lambda Function URL: %s", function_url)
         return FunctionURLIbexClient(
             function_url=function_url,
             use_iam_auth=use_iam_auth,
             **kwargs
         )
     elif api_url:
-        print(f"Using API Gateway: {api_url}")
+        logger.debug("Using API Gateway: %s", api_url)
         return OptimizedIbexClient(
             api_url=api_url,
             **kwargs
@@ -229,67 +254,3 @@ def create_ibex_client(prefer_function_url: bool = True, **kwargs) -> OptimizedI
     else:
         raise ValueError("No IbexDB endpoint configured. Set IBEX_FUNCTION_URL or IBEX_API_URL")
 
-
-# Performance comparison function
-def compare_endpoints():
-    """Compare performance between Function URL and API Gateway"""
-    import time
-    import statistics
-
-    print("="*60)
-    print("FUNCTION URL vs API GATEWAY PERFORMANCE COMPARISON")
-    print("="*60)
-
-    # Test payload
-    test_payload = {
-        "operation": "QUERY",
-        "table": "food_entries",
-        "limit": 10
-    }
-
-    # Test Function URL
-    if os.environ.get('IBEX_FUNCTION_URL'):
-        print("\n📊 Testing Function URL...")
-        function_client = FunctionURLIbexClient(
-            function_url=os.environ['IBEX_FUNCTION_URL'],
-            tenant_id="test"
-        )
-
-        function_times = []
-        for i in range(10):
-            start = time.perf_counter()
-            function_client._call(test_payload, use_cache=False)
-            end = time.perf_counter()
-            function_times.append((end - start) * 1000)
-            print(f"  Run {i+1}: {function_times[-1]:.2f}ms")
-
-        print(f"\n  Function URL Average: {statistics.mean(function_times):.2f}ms")
-        print(f"  Function URL P95: {sorted(function_times)[int(len(function_times)*0.95)]:.2f}ms")
-
-    # Test API Gateway
-    if os.environ.get('IBEX_API_URL'):
-        print("\n📊 Testing API Gateway...")
-        api_client = OptimizedIbexClient(
-            api_url=os.environ['IBEX_API_URL'],
-            api_key=os.environ.get('IBEX_API_KEY', ''),
-            tenant_id="test"
-        )
-
-        api_times = []
-        for i in range(10):
-            start = time.perf_counter()
-            api_client._call(test_payload, use_cache=False)
-            end = time.perf_counter()
-            api_times.append((end - start) * 1000)
-            print(f"  Run {i+1}: {api_times[-1]:.2f}ms")
-
-        print(f"\n  API Gateway Average: {statistics.mean(api_times):.2f}ms")
-        print(f"  API Gateway P95: {sorted(api_times)[int(len(api_times)*0.95)]:.2f}ms")
-
-    # Compare
-    if 'function_times' in locals() and 'api_times' in locals():
-        improvement = ((statistics.mean(api_times) - statistics.mean(function_times)) /
-                      statistics.mean(api_times)) * 100
-        print(f"\n🎯 Function URL is {improvement:.1f}% faster than API Gateway")
-
-    print("="*60)
\ No newline at end of file
@@ -4,13 +4,17 @@ NutriWealth IbexDB Client
 Extends ajna-cloud-sdk's OptimizedIbexClient with app-specific methods:
 - upload_file: Convenience method for base64 -> S3 upload via presigned URL
 - create_database: Database initialization
+- list_tables: Long-lived per-namespace cache (cleared by create_table/drop_table)
 - App-specific NEVER_CACHE_TABLES configuration
 """
 
 import json
 import logging
+import time
 import requests
-from typing import Any, Dict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any, Dict, Tuple
 
 from ajna_cloud.ibex import (
     OptimizedIbexClient as _SDKClient,
@@ -25,6 +29,20 @@ NEVER_CACHE_TABLES.update({
     'app_shopping_lists', 'app_shopping_list_items',
 })
 
+# Keep-alive connection pool shared by every client in the container, so
+# repeat calls to IbexDB / S3 skip the TCP+TLS handshake. Retries cover
+# connection failures only (non-idempotent POSTs are never re-sent after a read)
+HTTP_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.1))
+HTTP_SESSION.mount("https://", _ADAPTER)
+HTTP_SESSION.mount("http://", _ADAPTER)
+
+# LIST_TABLES results per (tenant_id, namespace) -> (expires_at, result).
+# Near-static, so kept out of the shared query cache with a longer TTL;
+# create_table/drop_table through this client clear it
+_LIST_TABLES_CACHE: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+_LIST_TABLES_TTL = 300  # 5 minutes
+
 
 class OptimizedIbexClient(_SDKClient):
     """
@@ -42,6 +60,33 @@ class OptimizedIbexClient(_SDKClient):
             "namespace": self.namespace,
         }, is_write=True)
 
+    def list_tables(self, *args, **kwargs) -> Dict[str, Any]:
+        """List tables, served from a per-namespace slot for _LIST_TABLES_TTL seconds."""
+        if args or kwargs:
+            return super().list_tables(*args, **kwargs)
+
+        slot = (self.tenant_id, self.namespace)
+        cached = _LIST_TABLES_CACHE.get(slot)
+        if cached and time.time() < cached[0]:
+            return cached[1]
+
+        result = super().list_tables()
+        if result and result.get('success'):
+            _LIST_TABLES_CACHE[slot] = (time.time() + _LIST_TABLES_TTL, result)
+        return result
+
+    def create_table(self, *args, **kwargs) -> Dict[str, Any]:
+        """Create a table and forget the cached table list."""
+        result = super().create_table(*args, **kwargs)
+        _LIST_TABLES_CACHE.pop((self.tenant_id, self.namespace), None)
+        return result
+
+    def drop_table(self, *args, **kwargs) -> Dict[str, Any]:
+        """Drop a table and forget the cached table list."""
+        result = super().drop_table(*args, **kwargs)
+        _LIST_TABLES_CACHE.pop((self.tenant_id, self.namespace), None)
+        return result
+
     def execute_sql(self, sql: str, params: list = None, namespace: str = None, timeout_ms: int = 30000) -> Dict[str, Any]:
         """Execute raw SQL via IbexDB EXECUTE_SQL operation."""
         payload = {
@@ -89,7 +134,7 @@ class OptimizedIbexClient(_SDKClient):
             elif isinstance(file_data, str):
                 file_data = file_data.encode('utf-8')
 
-            put_res = requests.put(
+            put_res = HTTP_SESSION.put(
                 upload_url,
                 data=file_data,
                 headers={'Content-Type': content_type},
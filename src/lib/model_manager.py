@@ -5,7 +5,8 @@ Simple, efficient model management without complex JSON types
 
 import os
 import time
-from typing import Dict, Optional, List
+import threading
+from typing import Dict, Optional, List, Tuple
 from dataclasses import dataclass
 from enum import Enum
 from lib.logger import logger
@@ -19,9 +20,9 @@ class AIProvider(Enum):
     TOGETHER = "together"
 
 
-@dataclass
+@dataclass(frozen=True)
 class ModelConfig:
-    """Simple model configuration"""
+    """Simple model configuration (immutable: instances are shared through the container cache)"""
     use_case: str
     provider: str
     model_name: str
@@ -59,9 +60,9 @@ class ModelManager:
     Uses Ibex DB for storage with Lambda container caching
     """
 
-    # Container-level cache (survives between Lambda invocations)
-    _config_cache: Dict[str, ModelConfig] = {}
-    _cache_time: float = 0
+    # Container-level cache (survives between Lambda invocations):
+    # use_case -> (config, expires_at epoch), each entry with its own TTL
+    _config_cache: Dict[str, Tuple[ModelConfig, float]] = {}
     _cache_ttl: int = 300  # 5 minutes
 
     # Default platform configuration (hardcoded fallback)
@@ -226,22 +227,8 @@ class ModelManager:
             return
 
         try:
-            records = []
-            for use_case, config in self.DEFAULT_CONFIGS.items():
-                records.append({
-                    "id": use_case,
-                    "use_case": config.use_case,
-                    "provider": config.provider,
-                    "model_name": config.model_name,
-                    "base_url": config.base_url,
-                    "temperature": config.temperature,
-                    "max_tokens": config.max_tokens,
-                    "timeout_seconds": config.timeout_seconds,
-                    "cost_per_1k_tokens": config.cost_per_1k_tokens,
-                    "fallback_provider": config.fallback_provider,
-                    "fallback_model": config.fallback_model,
-                    "is_active": True
-                })
+            # Shallow copies so the client can't alter the shared templates
+            records = [dict(record) for record in _DEFAULT_RECORDS]
 
             result = self.db.write("ai_model_config", records)
             if result.get('success'):
@@ -261,53 +248,42 @@ class ModelManager:
             ModelConfig object
         """
         # Check container cache first
-        if self._is_cache_valid():
-            if use_case in self._config_cache:
-                return self._config_cache[use_case]
+        entry = self._config_cache.get(use_case)
+        if entry and entry[1] > time.time():
+            return entry[0]
 
         # Try to fetch from database
         if self.db:
             self._ensure_table_exists()
 
-            try:
-                result = self.db.query(
-                    "ai_model_config",
-                    filters=[
-                        {"field": "use_case", "operator": "eq", "value": use_case},
-                        {"field": "is_active", "operator": "eq", "value": True}
-                    ],
-                    limit=1,
-                    include_deleted=False
-                )
-
-                if result.get('success') and result.get('data', {}).get('records'):
-                    record = result['data']['records'][0]
-
-                    # Create ModelConfig from record
-                    config = ModelConfig(
-                        use_case=record['use_case'],
-                        provider=record['provider'],
-                        model_name=record['model_name'],
-                        base_url=record.get('base_url'),
-                        temperature=float(record.get('temperature', 0.0)),
-                        max_tokens=int(record.get('max_tokens', 500)),
-                        timeout_seconds=int(record.get('timeout_seconds', 30)),
-                        cost_per_1k_tokens=float(record.get('cost_per_1k_tokens', 0.001)),
-                        fallback_provider=record.get('fallback_provider'),
-                        fallback_model=record.get('fallback_model')
+            # One query loads every use case; only fall back to a single-row
+            # query if that fails
+            if self._bulk_load():
+                entry = self._config_cache.get(use_case)
+                if entry:
+                    return entry[0]
+            else:
+                try:
+                    result = self.db.query(
+                        "ai_model_config",
+                        filters=[
+                            {"field": "use_case", "operator": "eq", "value": use_case},
+                            {"field": "is_active", "operator": "eq", "value": True}
+                        ],
+                        limit=1,
+                        include_deleted=False
                     )
 
-                    # Add API key env from provider config
-                    provider_cfg = self.PROVIDER_CONFIGS.get(config.provider, {})
-                    config.api_key_env = provider_cfg.get('api_key_env')
+                    if result.get('success') and result.get('data', {}).get('records'):
+                        config = self._config_from_record(result['data']['records'][0])
 
-                    # Update cache
-                    self._update_cache(use_case, config)
+                        # Update cache
+                        self._update_cache(use_case, config)
 
-                    return config
+                        return config
 
-            except Exception as e:
-                logger.warning(f"Could not fetch model config from DB: {e}")
+                except Exception as e:
+                    logger.warning(f"Could not fetch model config from DB: {e}")
 
         # Fall back to hardcoded defaults
         config = self.DEFAULT_CONFIGS.get(use_case)
@@ -318,17 +294,64 @@ class ModelManager:
         # Ultimate fallback
         return self.DEFAULT_CONFIGS["food"]
 
-    def _is_cache_valid(self) -> bool:
-        """Check if cache is still valid"""
-        return (time.time() - self._cache_time) < self._cache_ttl
+    def _config_from_record(self, record: Dict) -> ModelConfig:
+        """Create a ModelConfig from an ai_model_config row"""
+        return ModelConfig(
+            use_case=record['use_case'],
+            provider=record['provider'],
+            model_name=record['model_name'],
+            base_url=record.get('base_url'),
+            temperature=float(record.get('temperature', 0.0)),
+            max_tokens=int(record.get('max_tokens', 500)),
+            timeout_seconds=int(record.get('timeout_seconds', 30)),
+            cost_per_1k_tokens=float(record.get('cost_per_1k_tokens', 0.001)),
+            fallback_provider=record.get('fallback_provider'),
+            fallback_model=record.get('fallback_model'),
+            # API key env comes from the provider config
+            api_key_env=self.PROVIDER_CONFIGS.get(record['provider'], {}).get('api_key_env')
+        )
+
+    def _bulk_load(self) -> bool:
+        """
+        Load every active model config with one query and cache them all.
+        Use cases without an active row are cached with their defaults.
+
+        Returns:
+            True if the query succeeded
+        """
+        try:
+            result = self.db.query(
+                "ai_model_config",
+                filters=[{"field": "is_active", "operator": "eq", "value": True}],
+                limit=100,
+                include_deleted=False
+            )
+            if not result.get('success'):
+                return False
+
+            loaded = {}
+            for record in result.get('data', {}).get('records', []):
+                use_case = record.get('use_case')
+                if use_case and use_case not in loaded:
+                    loaded[use_case] = self._config_from_record(record)
+
+            for use_case, default in self.DEFAULT_CONFIGS.items():
+                loaded.setdefault(use_case, default)
+            for use_case, config in loaded.items():
+                self._update_cache(use_case, config)
+            return True
+
+        except Exception as e:
+            logger.warning(f"Could not bulk load model configs from DB: {e}")
+            return False
 
     def _update_cache(self, use_case: str, config: ModelConfig):
-        """Update the container cache"""
-        self._config_cache[use_case] = config
-        self._cache_time = time.time()
+        """Update the container cache entry for one use case"""
+        self._config_cache[use_case] = (config, time.time() + self._cache_ttl)
 
     def get_all_configs(self) -> Dict[str, ModelConfig]:
         """Get all model configurations"""
+        # get_model_config bulk-loads on the first miss, so a cold cache costs one query
         configs = {}
         for use_case in ["classifier", "food", "receipt", "workout", "shopping", "voice_stt", "voice_tts"]:
             configs[use_case] = self.get_model_config(use_case)
@@ -360,7 +383,6 @@ class ModelManager:
             if result.get('success'):
                 # Clear cache to force refresh
                 self._config_cache.clear()
-                self._cache_time = 0
                 logger.info(f"Updated model config for {use_case}")
                 return True
 
@@ -375,6 +397,9 @@ class ModelManager:
 
     _api_keys_loaded: bool = False
 
+    # provider -> resolved API key; cleared whenever keys are (re)loaded into os.environ
+    _api_key_cache: Dict[str, Optional[str]] = {}
+
     def load_api_keys_from_db(self):
         """Load API keys from IbexDB into os.environ (called once per cold start)"""
         if self._api_keys_loaded or not self.db:
@@ -391,6 +416,7 @@ class ModelManager:
                     if key_name and key_value:
                         os.environ[key_name] = key_value
                         loaded += 1
+                ModelManager._api_key_cache.clear()
                 if loaded:
                     logger.info(f"Loaded {loaded} API key(s) from IbexDB")
             ModelManager._api_keys_loaded = True
@@ -400,16 +426,15 @@ class ModelManager:
     def reload_api_keys(self):
         """Force reload API keys from IbexDB (called after admin updates keys)"""
         ModelManager._api_keys_loaded = False
+        ModelManager._api_key_cache.clear()
         self.load_api_keys_from_db()
 
     def get_api_key(self, provider: str) -> Optional[str]:
         """Get API key for a provider (from os.environ, populated from IbexDB on cold start)"""
-        provider_cfg = self.PROVIDER_CONFIGS.get(provider, {})
-        api_key_env = provider_cfg.get('api_key_env')
-
-        if api_key_env:
-            return os.environ.get(api_key_env)
-        return None
+        if provider not in self._api_key_cache:
+            api_key_env = self.PROVIDER_CONFIGS.get(provider, {}).get('api_key_env')
+            self._api_key_cache[provider] = os.environ.get(api_key_env) if api_key_env else None
+        return self._api_key_cache[provider]
 
     def list_available_models(self) -> Dict[str, List[str]]:
         """List available models per provider"""
@@ -440,18 +465,45 @@ class ModelManager:
         }
 
 
+# DEFAULT_CONFIGS as ai_model_config rows, built once per container
+_DEFAULT_RECORDS = tuple(
+    {
+        "id": use_case,
+        "use_case": config.use_case,
+        "provider": config.provider,
+        "model_name": config.model_name,
+        "base_url": config.base_url,
+        "temperature": config.temperature,
+        "max_tokens": config.max_tokens,
+        "timeout_seconds": config.timeout_seconds,
+        "cost_per_1k_tokens": config.cost_per_1k_tokens,
+        "fallback_provider": config.fallback_provider,
+        "fallback_model": config.fallback_model,
+        "is_active": True
+    }
+    for use_case, config in ModelManager.DEFAULT_CONFIGS.items()
+)
+
+
 # Singleton instance for Lambda container reuse
 _model_manager = None
+_model_manager_lock = threading.Lock()
 
 
 def get_model_manager(db_client=None) -> ModelManager:
     """Get or create model manager singleton"""
     global _model_manager
 
-    if _model_manager is None:
-        _model_manager = ModelManager(db_client)
-    elif db_client and not _model_manager.db:
-        # Update DB client if provided
-        _model_manager.db = db_client
+    manager = _model_manager
+    if manager is not None and (manager.db or not db_client):
+        # Fast path: no lock once the singleton is set up
+        return manager
+
+    with _model_manager_lock:
+        if _model_manager is None:
+            _model_manager = ModelManager(db_client)
+        elif db_client and not _model_manager.db:
+            # Update DB client if provided
+            _model_manager.db = db_client
 
     return _model_manager
\ No newline at end of file
@@ -5,10 +5,17 @@ Perfect for development and small-scale deployment
 
 import json
 import os
-from threading import Lock
+import time
+import atexit
+import orjson
+from threading import Event, Lock, Thread
 from typing import Dict, List, Optional, Any
 
 from utils.timestamps import utc_now, utc_epoch
+from lib.logger import logger
+
+# Mutations are persisted at most this often (seconds), by a background thread
+_FLUSH_INTERVAL = 0.5
 
 class SimpleStore:
     """
@@ -26,24 +33,60 @@ class SimpleStore:
         }
         self._load_from_file()
 
+        # Debounced persistence: mutators only mark the store dirty
+        self._dirty = False
+        self._flush_event = Event()
+        self._flush_lock = Lock()  # one writer at a time, so snapshots land in order
+        Thread(target=self._flush_loop, name="simple-store-flush", daemon=True).start()
+        atexit.register(self._flush_now)
+
     def _load_from_file(self):
         """Load data from file if it exists"""
         if os.path.exists(self.persist_file):
             try:
                 with open(self.persist_file, 'r') as f:
                     self.data = json.load(f)
-                print(f"✅ Loaded data from {self.persist_file}")
+                logger.info(f"Loaded data from {self.persist_file}")
             except Exception as e:
-                print(f"⚠️ Could not load data: {e}")
+                logger.warning(f"Could not load data: {e}")
 
     def _save_to_file(self):
-        """Save data to file for persistence"""
-        try:
-            os.makedirs(os.path.dirname(self.persist_file), exist_ok=True)
-            with open(self.persist_file, 'w') as f:
-                json.dump(self.data, f, indent=2, default=str)
-        except Exception as e:
-            print(f"⚠️ Could not save data: {e}")
+        """Schedule a save (call with self.lock held)"""
+        self._dirty = True
+        self._flush_event.set()
+
+    def _flush_loop(self):
+        """Coalesce saves: wait for a change, let more arrive, then write once"""
+        while True:
+            self._flush_event.wait()
+            time.sleep(_FLUSH_INTERVAL)
+            self._flush_event.clear()
+            self._flush_now()
+
+    def _flush_now(self):
+        """Write the current data to file if anything changed since the last write"""
+        with self._flush_lock:
+            try:
+                # Serialize under the store lock, write to disk outside it
+                with self.lock:
+                    if not self._dirty:
+                        return
+                    # Record ids need not be strings (json.dump accepted any key)
+                    snapshot = orjson.dumps(self.data, default=str, option=orjson.OPT_NON_STR_KEYS)
+                    self._dirty = False
+
+                directory = os.path.dirname(self.persist_file)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp_file = f"{self.persist_file}.tmp"
+                with open(tmp_file, 'wb') as f:
+                    f.write(snapshot)
+                os.replace(tmp_file, self.persist_file)
+            except Exception as e:
+                logger.warning(f"Could not save data: {e}")
+                # Stay dirty so the next change retries the save
+                with self.lock:
+                    self._dirty = True
 
     def write(self, table: str, records: List[Dict[str, Any]]) -> Dict:
         """
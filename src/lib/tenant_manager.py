@@ -5,6 +5,7 @@ Tenant Management for Multi-tenant Architecture
 import os
 import json
 from typing import Optional, Dict, Any
+from lib.logger import logger
 
 class TenantManager:
     """
@@ -40,9 +41,9 @@ class TenantManager:
                 cls._default_tenant = config.get('default_tenant', 'nutriwealth')
                 cls._feature_definitions = config.get('feature_definitions', {})
                 cls._config_loaded = True
-                print(f"Loaded {len(cls._tenant_config)} tenant configurations")
+                logger.info(f"Loaded {len(cls._tenant_config)} tenant configurations")
         except FileNotFoundError:
-            print(f"Warning: tenants.json not found at {config_path}, using defaults")
+            logger.warning(f"tenants.json not found at {config_path}, using defaults")
             cls._tenant_config = {
                 "test": {
                     "tenant_id": "nutriwealth",
@@ -53,7 +54,7 @@ class TenantManager:
             }
             cls._config_loaded = True
         except Exception as e:
-            print(f"Error loading tenant config: {e}")
+            logger.error(f"Error loading tenant config: {e}")
             cls._tenant_config = {
                 "test": {
                     "tenant_id": "nutriwealth",
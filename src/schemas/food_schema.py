@@ -0,0 +1,94 @@
+"""
+Food Analysis Schema for OpenAI Structured Outputs (strict mode)
+
+Mirrors the structure requested by prompts/food_system.md.
+Every object, nested ones included, lists all of its properties in "required"
+and sets "additionalProperties": False, as strict mode requires.
+No fields are nullable; the model always estimates a value.
+"""
+
+_string_list = {"type": "array", "items": {"type": "string"}}
+
+_health_rating = {
+    "type": "object",
+    "properties": {
+        "rating": {
+            "type": "string",
+            "enum": ["Excellent", "Good", "Moderate", "Poor"]
+        },
+        "suggestion": {"type": "string"}
+    },
+    "required": ["rating", "suggestion"],
+    "additionalProperties": False
+}
+
+
+FOOD_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "dish_name": {
+            "type": "string",
+            "description": "Short, recognizable dish name in Title Case (e.g. 'Chicken Curry With Rice')"
+        },
+        "food_items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "Individual ingredient with estimated weight (e.g. 'Basmati rice (250g)')"
+                    },
+                    "calories": {"type": "number"},
+                    "protein": {"type": "number", "description": "Grams"},
+                    "carbs": {"type": "number", "description": "Grams"},
+                    "fat": {"type": "number", "description": "Grams"},
+                    "fiber": {"type": "number", "description": "Grams"},
+                    "sodium": {"type": "number", "description": "Milligrams"}
+                },
+                "required": ["name", "calories", "protein", "carbs", "fat", "fiber", "sodium"],
+                "additionalProperties": False
+            }
+        },
+        "total_calories": {"type": "number"},
+        "meal_type": {
+            "type": "string",
+            "enum": ["breakfast", "lunch", "dinner", "snack"]
+        },
+        "cuisine": {
+            "type": "string",
+            "description": "e.g. 'Indian', 'Mediterranean', 'American'"
+        },
+        "dietary_tags": {
+            **_string_list,
+            "description": "e.g. 'High Protein', 'Low Carb', 'Gluten Free'"
+        },
+        "nutritional_summary": {"type": "string"},
+        "health_assessment": {
+            "type": "object",
+            "properties": {
+                "diabetes": _health_rating,
+                "hypertension": _health_rating
+            },
+            "required": ["diabetes", "hypertension"],
+            "additionalProperties": False
+        },
+        "nutrition_focus": {
+            "type": "object",
+            "properties": {
+                "nutrients_high": {**_string_list, "description": "e.g. 'Sodium', 'Saturated Fat'"},
+                "nutrients_low": {**_string_list, "description": "e.g. 'Fiber'"},
+                "suggestion": {"type": "string"}
+            },
+            "required": ["nutrients_high", "nutrients_low", "suggestion"],
+            "additionalProperties": False
+        },
+        "health_notes": {"type": "string"}
+    },
+    "required": [
+        "dish_name", "food_items", "total_calories", "meal_type", "cuisine",
+        "dietary_tags", "nutritional_summary", "health_assessment",
+        "nutrition_focus", "health_notes"
+    ],
+    "additionalProperties": False
+}
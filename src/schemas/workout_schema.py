@@ -0,0 +1,76 @@
+"""
+Workout Schema for OpenAI Structured Outputs (strict mode)
+
+Covers the structure requested by prompts/workout_system.md plus the fields
+the built-in fallback prompt asks for and _store_workout_result reads
+(intensity_level, muscle_groups, per-exercise calories_burned), so it fits
+whichever workout prompt is active.
+Every object, nested ones included, lists all of its properties in "required"
+and sets "additionalProperties": False, as strict mode requires.
+Fields the user may not have given (date, time, per-exercise metrics) are
+nullable via {"anyOf": [{"type": ...}, {"type": "null"}]}.
+"""
+
+# Helper for nullable string
+_nullable_string = {"anyOf": [{"type": "string"}, {"type": "null"}]}
+_nullable_number = {"anyOf": [{"type": "number"}, {"type": "null"}]}
+
+
+WORKOUT_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "workout_name": {
+            "type": "string",
+            "description": "Short, recognizable workout title in Title Case (e.g. 'Upper Body Strength')"
+        },
+        "workout_type": {
+            "type": "string",
+            "enum": ["Strength", "Cardio", "HIIT", "Yoga", "Flexibility", "Other"]
+        },
+        "workout_date": {
+            **_nullable_string,
+            "description": "Date in YYYY-MM-DD format if known"
+        },
+        "start_time": {
+            **_nullable_string,
+            "description": "Time in HH:MM format if known"
+        },
+        "duration_minutes": {"type": "number"},
+        "intensity_level": {
+            "type": "string",
+            "enum": ["low", "moderate", "high"]
+        },
+        "muscle_groups": {
+            "type": "string",
+            "description": "Comma-separated muscle groups worked (e.g. 'Chest, Triceps, Shoulders')"
+        },
+        "exercises": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "sets": {**_nullable_number},
+                    "reps": {**_nullable_number},
+                    "weight_lbs": {**_nullable_number},
+                    "distance_miles": {**_nullable_number},
+                    "duration_minutes": {**_nullable_number},
+                    "calories_burned": {"type": "number", "description": "Estimated calories for this exercise"}
+                },
+                "required": [
+                    "name", "sets", "reps", "weight_lbs", "distance_miles",
+                    "duration_minutes", "calories_burned"
+                ],
+                "additionalProperties": False
+            }
+        },
+        "calories_burned_estimate": {"type": "number"},
+        "notes": {"type": "string"}
+    },
+    "required": [
+        "workout_name", "workout_type", "workout_date", "start_time",
+        "duration_minutes", "intensity_level", "muscle_groups", "exercises",
+        "calories_burned_estimate", "notes"
+    ],
+    "additionalProperties": False
+}